@@ -7,6 +7,7 @@ WEB_DIRECTORY = "./web"
 NODE_DISPLAY_NAME_MAPPINGS = {
     "Load Styles CSV": "加载风格CSV文件",
     "Multi Styles CSV": "多风格合并节点",
+    "Batch Styles CSV": "批量风格提示词节点",
     "Preview Text": "预览文本节点"
 }
 
@@ -0,0 +1,296 @@
+"""
+风格CSV加载器的性能基准测试。
+
+不需要ComfyUI环境：folder_paths 和 server 模块会被替换为桩模块，翻译走离线桩后端。
+会在临时目录中生成不同行数、不同编码的风格CSV，以及指定深度的假 custom_nodes 目录树，
+然后测量 load_styles_csv、find_csv_files、INPUT_TYPES 和 MultiStylesCSVLoader.execute，
+结果（含峰值内存）以JSON输出，便于在版本之间比较。
+
+用法:
+    python benchmarks/bench_loader.py --rows 1000,10000,100000 --output bench.json
+    python benchmarks/bench_loader.py --compare old.json --output new.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# GBK 和 Big5 都能编码的词汇，保证各编码生成的内容一致
+NAME_WORDS = ["攝影", "風格", "人像", "城市", "夜景", "電影", "水彩", "油畫", "動漫", "科幻", "復古", "建築"]
+PROMPT_WORDS = [
+    "photography", "cinematic lighting", "highly detailed", "(masterpiece:1.2)", "soft focus", "bokeh",
+    "dramatic angles", "vivid colors", "sharp focus", "film grain", "golden hour", "wide angle",
+]
+NEGATIVE_PROMPT = ("bad anatomy, worst quality, low quality, blurry, lowres, JPEG artifacts, "
+                   "deformed, ugly, cropped, watermark, text, signature")
+
+
+def install_stubs(base_path):
+    """用桩模块替换ComfyUI提供的 folder_paths 和 server"""
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.base_path = base_path
+    folder_paths.get_user_directory = lambda: os.path.join(base_path, "user")
+    sys.modules["folder_paths"] = folder_paths
+    # 后台文件监视线程会干扰测量
+    os.environ.setdefault("STYLES_CSV_WATCH_INTERVAL", "0")
+
+    class Routes:
+        def get(self, path):
+            return lambda handler: handler
+
+        post = get
+
+    class PromptServer:
+        instance = None
+
+        def __init__(self):
+            self.routes = Routes()
+
+        def send_sync(self, event, data, sid=None):
+            pass
+
+    PromptServer.instance = PromptServer()
+    server = types.ModuleType("server")
+    server.PromptServer = PromptServer
+    sys.modules["server"] = server
+
+    # aiohttp 是ComfyUI的依赖，单独运行基准测试时可能没有安装
+    try:
+        import aiohttp.web  # noqa: F401
+    except ImportError:
+        web = types.ModuleType("aiohttp.web")
+        web.json_response = lambda *args, **kwargs: None
+        web.Response = lambda *args, **kwargs: None
+        aiohttp = types.ModuleType("aiohttp")
+        aiohttp.web = web
+        sys.modules["aiohttp"] = aiohttp
+        sys.modules["aiohttp.web"] = web
+
+
+def import_loader():
+    spec = importlib.util.spec_from_file_location(
+        "styles_csv_loader", os.path.join(REPO_DIR, "styles_csv_loader.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["styles_csv_loader"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_styles_csv(path, rows, encoding, seed=0):
+    """生成合成的风格CSV"""
+    rng = random.Random(seed)
+    buffer = io.StringIO(newline="")
+    buffer.write("name,prompt,negative_prompt\r\n")
+    for i in range(rows):
+        category = NAME_WORDS[i % len(NAME_WORDS)]
+        name = f"{category} | {rng.choice(NAME_WORDS)} {i}"
+        prompt = ", ".join(rng.sample(PROMPT_WORDS, 6))
+        buffer.write(f'{name},"{prompt}","{NEGATIVE_PROMPT}"\r\n')
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(buffer.getvalue())
+
+
+def build_custom_nodes_tree(root, depth, width, files_per_dir=3):
+    """生成假的 custom_nodes 目录树，包含普通文件、少量CSV和应被跳过的大目录"""
+    def build(directory, level):
+        os.makedirs(directory, exist_ok=True)
+        for i in range(files_per_dir):
+            with open(os.path.join(directory, f"module_{i}.py"), "w") as f:
+                f.write("# placeholder\n")
+        if level == depth:
+            write_styles_csv(os.path.join(directory, "styles.csv"), 10, "utf-8")
+            return
+        for name in ("node_modules", "__pycache__", ".git"):
+            heavy = os.path.join(directory, name)
+            os.makedirs(heavy, exist_ok=True)
+            for i in range(files_per_dir * 4):
+                open(os.path.join(heavy, f"blob_{i}.csv"), "w").close()
+        for i in range(width):
+            build(os.path.join(directory, f"pkg_{level}_{i}"), level + 1)
+
+    build(root, 0)
+
+
+def measure(func, repeat):
+    """多次运行 func，返回耗时统计"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "max": max(timings)}
+
+
+def peak_memory(func):
+    """单独运行一次 func 并记录 tracemalloc 的峰值内存"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(build):
+    """构建对象并返回它保留的内存（构建过程中的临时对象不计入）"""
+    tracemalloc.start()
+    try:
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+        del kept
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def run(args):
+    base_path = tempfile.mkdtemp(prefix="styles_csv_bench_")
+    install_stubs(base_path)
+    results = []
+
+    def record(name, func, repeat=args.repeat, setup=None, **params):
+        def target():
+            if setup:
+                setup()
+            func()
+        seconds = measure(target, repeat)
+        results.append({"name": name, **params, "seconds": seconds, "peak_bytes": peak_memory(target)})
+
+    try:
+        loader = import_loader()
+        loader.TRANSLATION_CACHE = loader.TranslationCache(path=":memory:")
+        loader.register_translation_backend("bench", lambda text: f"translated {len(text)}", cache=False)
+        loader.TRANSLATION_BACKEND = "bench"
+        cache = loader.STYLE_CATALOG_CACHE
+        # 加载器的日志不计入测量
+        loader.logger.setLevel(logging.CRITICAL)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # 加载不同行数和编码的CSV
+            for rows in args.rows:
+                for encoding in args.encodings:
+                    path = os.path.join(base_path, f"styles_{rows}_{encoding}.csv")
+                    write_styles_csv(path, rows, encoding)
+                    params = {"rows": rows, "encoding": encoding, "bytes": os.path.getsize(path)}
+                    record("load_styles_csv", lambda: loader.StylesCSVLoader.load_styles_csv(path), **params)
+                    record("catalog_cache.cold", lambda: cache.get(path),
+                           setup=lambda: cache.invalidate(path), **params)
+                    cache.get(path)
+                    record("catalog_cache.warm", lambda: cache.get(path), **params)
+                    cache.invalidate()
+                    # 普通字典与紧凑存储常驻内存的对比（缓存清空后测量，避免与缓存中的驻留字符串共享）
+                    results.append({
+                        "name": "catalog_memory", **params,
+                        "dict_bytes": retained_memory(lambda: loader.StylesCSVLoader.load_styles_csv(path)),
+                        "compact_bytes": retained_memory(
+                            lambda: loader.CompactStyleCatalog.from_dict(loader.StylesCSVLoader.load_styles_csv(path))
+                        ),
+                    })
+                    os.remove(path)
+
+            # CSV发现：冷扫描与增量扫描
+            custom_nodes = os.path.join(base_path, "custom_nodes")
+            build_custom_nodes_tree(custom_nodes, args.tree_depth, args.tree_width)
+            tree = {"depth": args.tree_depth, "width": args.tree_width}
+            record("find_csv_files.cold", loader.StylesCSVLoader.find_csv_files,
+                   setup=loader.CSV_DISCOVERY_INDEX.invalidate, **tree)
+            record("find_csv_files.warm", loader.StylesCSVLoader.find_csv_files, **tree)
+            results[-1]["entries_visited"] = loader.CSV_DISCOVERY_INDEX.last_scan_stats.get("entries_visited")
+
+            # 节点：默认 styles.csv 使用最大的行数
+            rows = max(args.rows)
+            write_styles_csv(os.path.join(base_path, "styles.csv"), rows, "utf-8")
+            node_params = {"rows": rows}
+            # 先加载一次，测量的是缓存命中后的常规刷新开销
+            loader.StylesCSVLoader.INPUT_TYPES()
+            record("StylesCSVLoader.INPUT_TYPES", loader.StylesCSVLoader.INPUT_TYPES, **node_params)
+            record("MultiStylesCSVLoader.INPUT_TYPES", loader.MultiStylesCSVLoader.INPUT_TYPES, **node_params)
+
+            node = loader.MultiStylesCSVLoader()
+            csv_file = next(iter(loader.MultiStylesCSVLoader.csv_files))
+            styles = list(cache.get(loader.MultiStylesCSVLoader.csv_files[csv_file]).keys())
+            selection = styles[:5]
+            for combine_mode in ("拼接", "去重", "去重并合并权重"):
+                record(
+                    "MultiStylesCSVLoader.execute",
+                    lambda: node.execute(csv_file, False, *selection,
+                                         positive_prefix="電影 人像", negative_suffix="模糊",
+                                         combine_mode=combine_mode),
+                    combine_mode=combine_mode, **node_params,
+                )
+    finally:
+        shutil.rmtree(base_path, ignore_errors=True)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def result_key(result):
+    return tuple(sorted((k, str(v)) for k, v in result.items()
+                        if k not in ("seconds", "peak_bytes", "bytes", "entries_visited",
+                                     "dict_bytes", "compact_bytes")))
+
+
+def compare(old_report, new_report):
+    """打印两次结果的中位数耗时与峰值内存之比"""
+    old = {result_key(r): r for r in old_report["results"]}
+    for result in new_report["results"]:
+        previous = old.get(result_key(result))
+        if previous is None or "seconds" not in result:
+            continue
+        time_ratio = result["seconds"]["median"] / max(previous["seconds"]["median"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(previous["peak_bytes"], 1)
+        label = " ".join(f"{k}={v}" for k, v in result_key(result))
+        print(f"{label}: time x{time_ratio:.2f}, peak memory x{memory_ratio:.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="逗号分隔的行数，例如 1000,10000,100000,1000000")
+    parser.add_argument("--encodings", default="utf-8,utf-8-sig,gbk,big5", help="逗号分隔的编码")
+    parser.add_argument("--tree-depth", type=int, default=3, help="假 custom_nodes 目录树的深度")
+    parser.add_argument("--tree-width", type=int, default=4, help="每层的子目录数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测量的重复次数")
+    parser.add_argument("--output", help="结果JSON的输出路径，默认输出到标准输出")
+    parser.add_argument("--compare", help="与之前保存的结果JSON比较")
+    args = parser.parse_args()
+    args.rows = [int(value) for value in args.rows.split(",") if value]
+    args.encodings = [value for value in args.encodings.split(",") if value]
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
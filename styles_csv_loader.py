@@ -1,268 +1,1997 @@
+import asyncio
+import bisect
 import os
 import re
 import folder_paths
 import csv
 import codecs
+import concurrent.futures
+import contextlib
+import hashlib
+import io
 import json
+import logging
+import mmap
 import shutil
 import requests
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections.abc import Mapping
+from fnmatch import fnmatch
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
 from server import PromptServer
 
-# 添加自动翻译功能
-def translate_chinese_to_english(text):
-    """将中文文本翻译为英文"""
-    if not text or text.strip() == "":
-        return ""
-    
-    # 替换中文标点为英文标点
-    punctuation_map = {
-        "，": ",",  # 中文逗号 -> 英文逗号
-        "。": ".",  # 中文句号 -> 英文句号
-        "；": ";",  # 中文分号 -> 英文分号
-        "：": ":",  # 中文冒号 -> 英文冒号
-        "！": "!",  # 中文感叹号 -> 英文感叹号
-        "？": "?",  # 中文问号 -> 英文问号
-        """: "\"",  # 中文引号 -> 英文引号
-        """: "\"",  # 中文引号 -> 英文引号
-        "「": "\"",  # 中文引号 -> 英文引号
-        "」": "\"",  # 中文引号 -> 英文引号
-        "【": "[",  # 中文方括号 -> 英文方括号
-        "】": "]",  # 中文方括号 -> 英文方括号
-        "（": "(",  # 中文圆括号 -> 英文圆括号
-        "）": ")",  # 中文圆括号 -> 英文圆括号
-        "《": "<",  # 中文尖括号 -> 英文尖括号
-        "》": ">",  # 中文尖括号 -> 英文尖括号
-        "、": ",",  # 中文顿号 -> 英文逗号
-        "～": "~",  # 中文波浪线 -> 英文波浪线
-        "·": "`",  # 中文间隔号 -> 英文反引号
-    }
-    
-    # 替换标点
-    for cn_punct, en_punct in punctuation_map.items():
-        text = text.replace(cn_punct, en_punct)
+
+logger = logging.getLogger("styles_csv_loader")
+
+
+def _env_list(name):
+    """读取逗号分隔的环境变量配置"""
+    value = os.environ.get(name, "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class LoaderStats:
+    """
+    进程内的计时与计数统计。
+    每个阶段保留最近 window 次耗时用于计算分位数和直方图，计数器为累计值。
+    """
+
+    # 直方图桶的上界（秒）
+    BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, float("inf"))
+
+    def __init__(self, window=512):
+        self.window = window
+        self._timings = {}  # 阶段 -> 最近的耗时
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            timings = self._timings.get(stage)
+            if timings is None:
+                timings = self._timings[stage] = deque(maxlen=self.window)
+            timings.append(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    @classmethod
+    def _summarize(cls, timings):
+        ordered = sorted(timings)
+        count = len(ordered)
+
+        def quantile(q):
+            return ordered[min(int(q * count), count - 1)]
+
+        histogram = {}
+        position = 0
+        for bound in cls.BUCKETS:
+            start = position
+            while position < count and ordered[position] <= bound:
+                position += 1
+            histogram["+Inf" if bound == float("inf") else f"{bound:g}"] = position - start
+        return {
+            "count": count,
+            "mean": sum(ordered) / count,
+            "p50": quantile(0.5),
+            "p90": quantile(0.9),
+            "p99": quantile(0.99),
+            "max": ordered[-1],
+            "histogram": histogram,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            timings = {stage: list(values) for stage, values in self._timings.items() if values}
+            counters = dict(self._counters)
+        return {
+            "timings": {stage: self._summarize(values) for stage, values in timings.items()},
+            "counters": counters,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+# 全局统计，可通过 /styles_csv_loader/stats 查看
+STATS = LoaderStats()
+
+
+# 中文标点 -> 英文标点
+PUNCTUATION_MAP = {
+    "，": ",",  # 中文逗号 -> 英文逗号
+    "。": ".",  # 中文句号 -> 英文句号
+    "；": ";",  # 中文分号 -> 英文分号
+    "：": ":",  # 中文冒号 -> 英文冒号
+    "！": "!",  # 中文感叹号 -> 英文感叹号
+    "？": "?",  # 中文问号 -> 英文问号
+    "\u201c": "\"",  # 中文引号 -> 英文引号
+    "\u201d": "\"",  # 中文引号 -> 英文引号
+    "「": "\"",  # 中文引号 -> 英文引号
+    "」": "\"",  # 中文引号 -> 英文引号
+    "【": "[",  # 中文方括号 -> 英文方括号
+    "】": "]",  # 中文方括号 -> 英文方括号
+    "（": "(",  # 中文圆括号 -> 英文圆括号
+    "）": ")",  # 中文圆括号 -> 英文圆括号
+    "《": "<",  # 中文尖括号 -> 英文尖括号
+    "》": ">",  # 中文尖括号 -> 英文尖括号
+    "、": ",",  # 中文顿号 -> 英文逗号
+    "～": "~",  # 中文波浪线 -> 英文波浪线
+    "·": "`",  # 中文间隔号 -> 英文反引号
+}
+_PUNCTUATION_TABLE = str.maketrans(PUNCTUATION_MAP)
+
+
+def contains_chinese(text):
+    """检测文本是否包含中文字符"""
+    return any(u'\u4e00' <= char <= u'\u9fff' for char in text)
+
+
+# 翻译器实例只创建一次，避免每次调用都重新初始化
+_translator_instances = {}
+
+
+def _googletrans_backend(text):
+    """使用googletrans库进行翻译（免费，不需要API key）"""
+    translator = _translator_instances.get("googletrans")
+    if translator is None:
+        from googletrans import Translator
+        translator = _translator_instances["googletrans"] = Translator()
+    return translator.translate(text, src='zh-cn', dest='en').text
+
+
+def _deep_translator_backend(text):
+    """使用deep_translator库进行翻译"""
+    translator = _translator_instances.get("deep_translator")
+    if translator is None:
+        from deep_translator import GoogleTranslator
+        translator = _translator_instances["deep_translator"] = GoogleTranslator(source='zh-cn', target='en')
+    return translator.translate(text)
+
+
+class DictionaryTranslator:
+    """
+    离线词典翻译器。
+    词典文件编译成前缀树后只需一次线性扫描，按最长匹配替换；
+    词典文件变化时自动重新编译，已翻译过的文本直接从内存中返回。
+    """
+
+    # 随节点一起发布的词典文件
+    DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_dict.txt")
+    _TERMINAL = ""  # 前缀树中表示词条结束的键（不会与单个字符冲突）
+
+    def __init__(self, paths=None, memo_size=4096):
+        self.paths = list(paths) if paths else [self.DEFAULT_PATH]
+        self.memo_size = memo_size
+        self._trie = {}
+        self._max_len = 0
+        self._fingerprints = None
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_entries(path):
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "\t" not in line:
+                    continue
+                source, target = line.split("\t", 1)
+                if source.strip() and target.strip():
+                    yield source.strip(), target.strip()
+
+    def _compile(self, fingerprints):
+        trie = {}
+        max_len = 0
+        count = 0
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                for source, target in self._read_entries(path):
+                    node = trie
+                    for char in source:
+                        node = node.setdefault(char, {})
+                    # 后加载的词典覆盖前面的同名词条
+                    node[self._TERMINAL] = target
+                    max_len = max(max_len, len(source))
+                    count += 1
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning("加载翻译词典失败 %s: %s", path, e)
+        self._trie = trie
+        self._max_len = max_len
+        self._fingerprints = fingerprints
+        self._memo.clear()
+        logger.debug("Compiled translation dictionary with %d entries.", count)
+
+    def _ensure_compiled(self):
+        fingerprints = tuple(StyleCatalogCache.fingerprint(path) for path in self.paths)
+        if fingerprints != self._fingerprints:
+            self._compile(fingerprints)
+
+    @staticmethod
+    def _is_word_char(char):
+        return char.isascii() and char.isalnum()
+
+    def _translate(self, text):
+        trie = self._trie
+        terminal = self._TERMINAL
+        out = []
+        last_translated = False
+        i = 0
+        n = len(text)
+        while i < n:
+            # 从当前位置沿前缀树向下走，记录最长的完整词条
+            node = trie
+            match_end = -1
+            match_value = None
+            j = i
+            while j < n:
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+                if terminal in node:
+                    match_end = j
+                    match_value = node[terminal]
+            if match_value is not None:
+                # 英文单词之间补空格
+                if out and self._is_word_char(out[-1][-1]) and self._is_word_char(match_value[0]):
+                    out.append(" ")
+                out.append(match_value)
+                last_translated = True
+                i = match_end
+            else:
+                char = text[i]
+                if last_translated and self._is_word_char(char):
+                    out.append(" ")
+                out.append(char)
+                last_translated = False
+                i += 1
+        return "".join(out)
+
+    def translate(self, text):
+        with self._lock:
+            self._ensure_compiled()
+            result = self._memo.get(text)
+            if result is not None:
+                self._memo.move_to_end(text)
+                return result
+            result = self._translate(text)
+            self._memo[text] = result
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+            return result
+
+
+# 全局离线词典翻译器，额外的词典文件可通过环境变量 STYLES_CSV_DICTIONARY 指定（逗号分隔）
+DICTIONARY_TRANSLATOR = DictionaryTranslator([DictionaryTranslator.DEFAULT_PATH] + _env_list("STYLES_CSV_DICTIONARY"))
+
+
+def _dictionary_backend(text):
+    """没有安装翻译库时，使用离线词典按最长匹配翻译"""
+    text = DICTIONARY_TRANSLATOR.translate(text)
     
-    # 检测文本是否包含中文字符
-    if not any(u'\u4e00' <= char <= u'\u9fff' for char in text):
-        return text  # 如果没有中文字符，直接返回已转换标点的文本
+    # 如果文本未被完全转换（仍然包含中文字符）
+    if contains_chinese(text):
+        logger.warning("文本包含未能翻译的中文字符，建议安装翻译库以获得更好的效果。")
     
-    try:
-        # 尝试使用googletrans库进行翻译（免费，不需要API key）
+    return text
+
+
+def _fake_backend(text):
+    """离线测试用的假翻译后端，不访问网络，结果可预测；与网络后端一样经过持久缓存"""
+    return f"[en] {text}"
+
+
+# 可用的翻译后端：名称 -> 函数。函数在依赖缺失时抛出 ImportError
+TRANSLATION_BACKENDS = {
+    "googletrans": _googletrans_backend,
+    "deep_translator": _deep_translator_backend,
+    "dictionary": _dictionary_backend,
+    "fake": _fake_backend,
+}
+# 不写入持久缓存的后端（本地计算本身就很快）
+UNCACHED_BACKENDS = {"dictionary"}
+# 翻译后端选择，auto 表示按 googletrans -> deep_translator -> dictionary 的顺序自动选择
+TRANSLATION_BACKEND = os.environ.get("STYLES_CSV_TRANSLATOR", "auto")
+
+
+def register_translation_backend(name, func, cache=True):
+    """注册自定义翻译后端，例如测试用的本地假后端"""
+    TRANSLATION_BACKENDS[name] = func
+    if cache:
+        UNCACHED_BACKENDS.discard(name)
+    else:
+        UNCACHED_BACKENDS.add(name)
+
+
+def _resolve_translation_backend():
+    """返回当前使用的翻译后端名称"""
+    if TRANSLATION_BACKEND != "auto":
+        return TRANSLATION_BACKEND
+    for name, module in (("googletrans", "googletrans"), ("deep_translator", "deep_translator")):
         try:
-            from googletrans import Translator
-            translator = Translator()
-            result = translator.translate(text, src='zh-cn', dest='en')
-            return result.text
+            __import__(module)
+            return name
         except ImportError:
-            # 如果没有安装googletrans库，尝试使用deep_translator库
+            continue
+    return "dictionary"
+
+
+class TranslationCache:
+    """
+    持久化的翻译缓存，保存在ComfyUI用户目录下的SQLite文件中。
+    以 (后端, 规范化后的原文) 为键，超过容量时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path=None, max_bytes=8 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_path():
+        try:
+            user_dir = folder_paths.get_user_directory()
+        except AttributeError:
+            user_dir = os.path.join(folder_paths.base_path, "user")
+        return os.path.join(user_dir, "styles_csv_loader", "translation_cache.sqlite3")
+
+    @staticmethod
+    def normalize(text):
+        """规范化原文：统一全角/半角并合并空白"""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    def _connect(self):
+        if self._conn is None:
+            path = self.path or self.default_path()
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "backend TEXT NOT NULL, source TEXT NOT NULL, result TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (backend, source))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, backend, text):
+        key = self.normalize(text)
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT result FROM translations WHERE backend = ? AND source = ?", (backend, key)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE translations SET last_used = ? WHERE backend = ? AND source = ?",
+                    (time.time(), backend, key),
+                )
+                conn.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning("翻译缓存读取失败: %s", e)
+            return None
+
+    def put(self, backend, text, result):
+        key = self.normalize(text)
+        size = len(key.encode("utf-8")) + len(result.encode("utf-8"))
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations (backend, source, result, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (backend, key, result, size, time.time()),
+                )
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("翻译缓存写入失败: %s", e)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 从最久未使用的条目开始删除，直到低于容量上限
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for backend, source, size in conn.execute(
+            "SELECT backend, source, size FROM translations ORDER BY last_used"
+        ):
+            doomed.append((backend, source))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM translations WHERE backend = ? AND source = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM translations")
+            conn.commit()
+
+
+# 全局翻译缓存
+TRANSLATION_CACHE = TranslationCache()
+
+
+class CircuitBreaker:
+    """
+    翻译后端的熔断器。
+    连续失败达到阈值后打开，期间直接使用离线翻译；冷却时间过后放行一次试探请求，
+    成功则恢复，失败则继续保持打开。
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # 半开状态：放行一次试探，在结果出来之前重新计时
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("翻译后端连续失败 %d 次，暂时改用离线词典翻译", self.failures)
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+
+# 每次执行翻译的总等待时间上限（秒），可通过环境变量 STYLES_CSV_TRANSLATE_TIMEOUT 配置
+TRANSLATION_TIMEOUT = float(os.environ.get("STYLES_CSV_TRANSLATE_TIMEOUT", 5.0))
+# 在调用线程中直接运行、不需要超时保护的本地后端
+OFFLINE_BACKENDS = {"dictionary"}
+TRANSLATION_BREAKER = CircuitBreaker()
+_TRANSLATION_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="styles_csv_translate")
+
+
+def _run_backend(backend, text):
+    with STATS.timed(f"translate.{backend}"):
+        return TRANSLATION_BACKENDS[backend](text)
+
+
+def _offline_translate(text):
+    """网络翻译超时、出错或熔断时的离线兜底"""
+    try:
+        return _dictionary_backend(text)
+    except Exception as e:
+        logger.warning("离线翻译出错: %s", e)
+        return text
+
+
+def _store_late_result(backend, text, future):
+    """超时之后才完成的翻译仍然写入缓存，下次可以直接命中"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if result and backend not in UNCACHED_BACKENDS:
+        TRANSLATION_CACHE.put(backend, text, result)
+
+
+@STATS.timed("translate")
+def translate_batch(texts, timeout=None):
+    """并发翻译一组文本，总耗时不超过 timeout 秒（默认 TRANSLATION_TIMEOUT）。
+
+    没有中文或命中缓存的文本直接返回；其余文本提交到有界线程池，
+    截止时间内未完成或出错的改用离线词典翻译。
+    """
+    timeout = TRANSLATION_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    results = list(texts)
+    pending = {}  # 下标 -> 需要翻译的文本
+    
+    for i, text in enumerate(texts):
+        if not text or text.strip() == "":
+            results[i] = ""
+            continue
+        # 替换中文标点为英文标点
+        text = text.translate(_PUNCTUATION_TABLE)
+        results[i] = text
+        # 如果没有中文字符，直接返回已转换标点的文本
+        if contains_chinese(text):
+            pending[i] = text
+    if not pending:
+        return results
+
+    backend = _resolve_translation_backend()
+    if backend in OFFLINE_BACKENDS:
+        logger.debug("没有安装翻译库，使用简单的映射转换")
+        for i, text in pending.items():
+            results[i] = _offline_translate(text)
+        return results
+
+    use_cache = backend not in UNCACHED_BACKENDS
+    futures = {}
+    for i, text in pending.items():
+        if use_cache:
+            cached = TRANSLATION_CACHE.get(backend, text)
+            if cached is not None:
+                STATS.incr("translation_cache_hits")
+                results[i] = cached
+                continue
+            STATS.incr("translation_cache_misses")
+        if not TRANSLATION_BREAKER.allow():
+            STATS.incr("translation_breaker_skips")
+            results[i] = _offline_translate(text)
+            continue
+        futures[i] = _TRANSLATION_EXECUTOR.submit(_run_backend, backend, text)
+
+    if futures:
+        concurrent.futures.wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+    for i, future in futures.items():
+        text = pending[i]
+        if not future.done():
+            STATS.incr("translation_timeouts")
+            TRANSLATION_BREAKER.record_failure()
+            logger.warning("翻译超时（%.1f 秒），使用离线词典翻译", timeout)
+            future.add_done_callback(lambda f, text=text: _store_late_result(backend, text, f))
+            results[i] = _offline_translate(text)
+            continue
+        error = future.exception()
+        if error is not None or not future.result():
+            STATS.incr("translation_errors")
+            TRANSLATION_BREAKER.record_failure()
+            logger.warning("翻译过程中出错: %s", error)
+            results[i] = _offline_translate(text)
+            continue
+        TRANSLATION_BREAKER.record_success()
+        results[i] = future.result()
+        if use_cache:
+            TRANSLATION_CACHE.put(backend, text, results[i])
+    return results
+
+
+# 添加自动翻译功能
+def translate_chinese_to_english(text, timeout=None):
+    """将中文文本翻译为英文"""
+    return translate_batch([text], timeout)[0]
+
+
+class StyleSidecarIndex(Mapping):
+    """
+    CSV旁边预编译的二进制索引文件（<文件名>.csv.<mtime>-<大小>.styleidx）。
+    文件中保存名称表（以NUL字符分隔的一整块），以及指向提示词字符串区的偏移/长度数组；
+    字符串区通过 mmap 按需读取，
+    多个进程打开同一个索引时共享内存页。CSV 的 mtime 或大小变化时自动重建；
+    文件名包含CSV指纹，重建时写入新文件而不是覆盖仍被 mmap 的旧文件（Windows 上无法替换）。
+    行为与风格字典一致：键为风格名，值为 [positive, negative]。
+    """
+
+    MAGIC = b"SCIX"
+    VERSION = 1
+    SUFFIX = ".styleidx"
+    # magic, 版本, 字节序, CSV mtime_ns, CSV 大小, 风格数量, 名称表字节数, 编码；按8字节对齐
+    _HEADER = struct.Struct("<4sHcxQQIQ16s4x")
+    _BYTEORDER = b"<" if sys.byteorder == "little" else b">"
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byteorder, mtime_ns, size, count, names_size, encoding = self._HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC or version != self.VERSION or byteorder != self._BYTEORDER:
+            raise ValueError(f"Unsupported style index: {path}")
+        self.path = path
+        self.source_mtime_ns = mtime_ns
+        self.source_size = size
+        self.encoding = encoding.rstrip(b"\0").decode("ascii") or None
+
+        # 每个风格两个槽位：正向、负向
+        offsets_start = self._HEADER.size
+        lengths_start = offsets_start + 8 * 2 * count
+        names_start = lengths_start + 4 * 2 * count
+        self._blob_start = names_start + names_size
+        if len(self._mm) < self._blob_start:
+            raise ValueError(f"Truncated style index: {path}")
+        view = memoryview(self._mm)
+        self._offsets = view[offsets_start:lengths_start].cast("Q")
+        self._lengths = view[lengths_start:names_start].cast("I")
+
+        # 只解码名称表，提示词在访问时才从 mmap 中读取
+        names = self._mm[names_start:self._blob_start].decode("utf-8").split("\0") if count else []
+        if len(names) != count:
+            raise ValueError(f"Corrupted style index: {path}")
+        self._index = dict(zip(names, range(count)))
+
+    def _string(self, slot):
+        start = self._blob_start + self._offsets[slot]
+        return self._mm[start:start + self._lengths[slot]].decode("utf-8")
+
+    def __getitem__(self, name):
+        i = self._index[name]
+        return [self._string(2 * i), self._string(2 * i + 1)]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def resident_size(self):
+        """估算常驻内存（只有名称表，字符串区在 mmap 中）"""
+        return sys.getsizeof(self._index) + sum(sys.getsizeof(name) for name in self._index)
+
+    @classmethod
+    def candidate_paths(cls, csv_path, fingerprint):
+        """索引文件的候选位置：CSV旁边，或者用户目录下（CSV目录不可写时）。
+
+        Returns:
+            list: [(索引路径, 同一CSV旧版本索引的文件名前缀)]
+        """
+        version = f".{fingerprint[1]:x}-{fingerprint[2]:x}{cls.SUFFIX}"
+        prefix = os.path.basename(csv_path) + "."
+        digest = hashlib.sha1(os.path.abspath(csv_path).encode("utf-8")).hexdigest()
+        try:
+            user_dir = folder_paths.get_user_directory()
+        except AttributeError:
+            user_dir = os.path.join(folder_paths.base_path, "user")
+        fallback_dir = os.path.join(user_dir, "styles_csv_loader", "sidecars")
+        return [
+            (csv_path + version, prefix),
+            (os.path.join(fallback_dir, digest + version), digest + "."),
+        ]
+
+    @classmethod
+    def remove_stale(cls, path, prefix):
+        """删除同一CSV旧版本的索引；仍被其他进程映射（Windows）时跳过，下次重建再删"""
+        directory = os.path.dirname(path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        pattern = re.compile(re.escape(prefix) + r"[0-9a-f]+-[0-9a-f]+" + re.escape(cls.SUFFIX))
+        for name in names:
+            stale = os.path.join(directory, name)
+            if pattern.fullmatch(name) and stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    @classmethod
+    def write(cls, path, styles, fingerprint, encoding=None):
+        """把风格字典写成索引文件，先写临时文件再原子替换"""
+        # 名称中不会出现\0（csv模块也不接受），可以安全地用作分隔符
+        names = "\0".join(styles.keys()).encode("utf-8")
+        blob = bytearray()
+        offsets = array("Q")
+        lengths = array("I")
+        for positive, negative in styles.values():
+            for text in (positive, negative):
+                data = text.encode("utf-8")
+                offsets.append(len(blob))
+                lengths.append(len(data))
+                blob += data
+        header = cls._HEADER.pack(cls.MAGIC, cls.VERSION, cls._BYTEORDER, fingerprint[1], fingerprint[2],
+                                  len(styles), len(names), (encoding or "").encode("ascii")[:16])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            offsets.tofile(f)
+            lengths.tofile(f)
+            f.write(names)
+            f.write(blob)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            # 另一个进程已经生成了同一版本的索引并正在使用
+            if not os.path.exists(path):
+                raise
+
+    @classmethod
+    def open_or_build(cls, csv_path, fingerprint, encoding_hint=None):
+        """打开与CSV指纹一致的索引，没有或已过期时重新解析CSV并生成。
+
+        Returns:
+            tuple: (风格映射, 编码)。解析失败时返回错误占位字典和 None
+        """
+        candidates = cls.candidate_paths(csv_path, fingerprint)
+        for path, _ in candidates:
+            if not os.path.exists(path):
+                continue
+            try:
+                index = cls(path)
+            except (OSError, ValueError, struct.error):
+                continue
+            if (index.source_mtime_ns, index.source_size) == (fingerprint[1], fingerprint[2]):
+                return index, index.encoding
+
+        styles, encoding = StylesCSVLoader.read_styles_csv(csv_path, encoding_hint)
+        if encoding is None:
+            return styles, None
+        for path, prefix in candidates:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                cls.write(path, styles, fingerprint, encoding)
+                logger.info("Built style index %s with %d styles.", path, len(styles))
+                cls.remove_stale(path, prefix)
+                return cls(path), encoding
+            except (OSError, ValueError) as e:
+                logger.warning("Could not write style index %s: %s", path, e)
+        return styles, encoding
+
+
+class LazyStyleCatalog(Mapping):
+    """
+    按需解码的风格目录。
+    首次加载只扫描原始字节，记录每行的风格名和字节偏移；提示词在访问时才从文件中读取该行并解码，
+    解码结果保存在一个小的LRU中，常驻内存取决于实际使用的风格数量而不是目录大小。
+    行为与风格字典一致：键为风格名，值为 [positive, negative]。
+    """
+
+    # 引号包围的风格名，"" 表示转义的引号
+    _QUOTED_NAME_RE = re.compile(rb'"((?:[^"]|"")*)"([^,\r\n]*)')
+    # 这些编码的多字节字符不会包含引号、逗号和换行字节，可以直接在原始字节上切分
+    SUPPORTED_ENCODINGS = {"utf-8", "utf-8-sig", "gbk", "gb18030", "big5"}
+
+    def __init__(self, path, encoding, index, starts, lengths, max_cached=256):
+        self.path = path
+        self.encoding = encoding
+        self._index = index  # 风格名 -> 行号
+        self._starts = starts  # 每行的字节偏移
+        self._lengths = lengths  # 每行的字节长度
+        self._bodies = OrderedDict()  # 已解码行的LRU
+        self._max_cached = max_cached
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _scan_rows(cls, data, position):
+        """逐行扫描原始字节，生成 (起始偏移, 结束偏移, 引号数量)。
+        引号数量为奇数时说明字段跨行，继续合并下一行，与csv模块的多行字段一致。
+        """
+        newline = b"\n" if b"\n" in data or b"\r" not in data else b"\r"
+        size = len(data)
+        while position < size:
+            end = position
+            quotes = 0
+            while True:
+                found = data.find(newline, end)
+                stop = size if found == -1 else found + 1
+                quotes += data.count(b'"', end, stop)
+                end = stop
+                if quotes % 2 == 0 or end >= size:
+                    break
+            yield position, end, quotes
+            position = end
+
+    @classmethod
+    def _row_name(cls, data, start, end, quotes):
+        """返回 (原始风格名字节, 是否至少有3列)"""
+        if not quotes:
+            comma = data.find(b",", start, end)
+            columns = data.count(b",", start, end) + 1
+            return data[start:comma if comma != -1 else end], columns >= 3
+        row = data[start:end]
+        # 按引号切分后偶数位置的片段在引号外，统计其中的逗号即为字段分隔符
+        columns = sum(part.count(b",") for part in row.split(b'"')[0::2]) + 1
+        if row.startswith(b'"'):
+            match = cls._QUOTED_NAME_RE.match(row)
+            if match:
+                return match.group(1).replace(b'""', b'"') + match.group(2), columns >= 3
+        comma = row.find(b",")
+        return row[:comma if comma != -1 else len(row)], columns >= 3
+
+    @classmethod
+    def load(cls, path, encoding_hint=None):
+        """扫描文件建立名称和偏移索引，编码不支持时退回完整解析。
+
+        Returns:
+            tuple: (风格映射, 编码)
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            STATS.incr("bytes_read", len(data))
+            # 分块校验编码，不保留整个文件的解码结果；建立索引时只解码名称
+            encoding = StylesCSVLoader.detect_encoding(data, encoding_hint)
+        except OSError as e:
+            logger.error("Error reading CSV file %s: %s", path, e)
+            return StylesCSVLoader.read_styles_csv(path, encoding_hint)
+        if encoding not in cls.SUPPORTED_ENCODINGS:
+            return StylesCSVLoader.read_styles_csv(path, encoding)
+
+        position = len(codecs.BOM_UTF8) if data.startswith(codecs.BOM_UTF8) else 0
+        name_encoding = "utf-8" if encoding == "utf-8-sig" else encoding
+        index = {}
+        starts = array("Q")
+        lengths = array("I")
+        rows = cls._scan_rows(data, position)
+        next(rows, None)  # 跳过标题行
+        try:
+            for start, end, quotes in rows:
+                name, complete = cls._row_name(data, start, end, quotes)
+                if not complete:  # 确保行至少有3列
+                    continue
+                index[name.decode(name_encoding).strip()] = len(starts)
+                starts.append(start)
+                lengths.append(end - start)
+        except UnicodeDecodeError as e:
+            logger.warning("Lazy scan of %s failed (%s), loading it fully", path, e)
+            return StylesCSVLoader.read_styles_csv(path, encoding)
+
+        if not index:
+            return StylesCSVLoader.read_styles_csv(path, encoding)
+        STATS.incr("rows_parsed", len(starts))
+        logger.debug("Indexed CSV file using %s encoding. Found %d styles (lazy).", encoding, len(index))
+        return cls(path, name_encoding, index, starts, lengths), encoding
+
+    def _read_row(self, row):
+        with open(self.path, "rb") as f:
+            f.seek(self._starts[row])
+            chunk = f.read(self._lengths[row])
+        STATS.incr("bytes_read", len(chunk))
+        try:
+            text = chunk.decode(self.encoding)
+        except UnicodeDecodeError:
+            # 建立索引时整个文件已校验过编码，解码失败说明文件已被修改，按不存在处理
+            return []
+        fields = next(csv.reader(io.StringIO(text, newline="")), [])
+        return fields
+
+    def __getitem__(self, name):
+        row = self._index[name]
+        with self._lock:
+            body = self._bodies.get(row)
+            if body is not None:
+                self._bodies.move_to_end(row)
+                return list(body)
+        fields = self._read_row(row)
+        # 文件在两次加载之间被修改时偏移会失效，此时视为不存在，等待缓存按新指纹重新加载
+        if len(fields) < 3 or fields[0].strip() != name:
+            raise KeyError(name)
+        body = (fields[1].strip(), fields[2].strip())
+        with self._lock:
+            self._bodies[row] = body
+            if len(self._bodies) > self._max_cached:
+                self._bodies.popitem(last=False)
+        return list(body)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def resident_size(self):
+        """估算常驻内存：名称表、偏移数组和已解码的行"""
+        with self._lock:
+            bodies = sum(sys.getsizeof(p) + sys.getsizeof(n) for p, n in self._bodies.values())
+        return (sys.getsizeof(self._index) + sum(sys.getsizeof(name) for name in self._index)
+                + self._starts.itemsize * len(self._starts) + self._lengths.itemsize * len(self._lengths)
+                + bodies)
+
+
+class CompactStyleCatalog(Mapping):
+    """
+    紧凑的内存风格目录：相同的提示词只保存一份（并通过 sys.intern 在多个目录之间共享），
+    每行只占字符串表中的两个下标（并列的 array），不再为每行创建 [正向, 负向] 列表。
+    读取时返回新的列表，对节点来说与普通字典相同。
+    """
+
+    def __init__(self, index, strings, rows):
+        self._index = index  # 风格名 -> 行号
+        self._strings = strings  # 去重后的提示词
+        self._rows = rows  # array("I")：每行依次为正向、负向提示词在字符串表中的下标
+        self._resident = None
+
+    @classmethod
+    def from_dict(cls, styles):
+        """从 {风格名: [正向, 负向]} 构建紧凑目录"""
+        pool = {}
+        ids = [pool.setdefault(text, len(pool)) for value in styles.values() for text in value[:2]]
+        strings = [sys.intern(text) for text in pool]
+        index = {sys.intern(name): row for row, name in enumerate(styles)}
+        return cls(index, strings, array("I", ids))
+
+    def extended(self, styles):
+        """返回追加了 styles 中各行的新目录（同名风格被覆盖），原目录保持不变"""
+        pool = {text: i for i, text in enumerate(self._strings)}
+        strings = list(self._strings)
+        index = dict(self._index)
+        rows = array("I", self._rows)
+        for name, value in styles.items():
+            ids = []
+            for text in value[:2]:
+                i = pool.get(text)
+                if i is None:
+                    i = pool[text] = len(strings)
+                    strings.append(sys.intern(text))
+                ids.append(i)
+            row = index.get(name)
+            if row is None:
+                index[sys.intern(name)] = len(rows) // 2
+                rows.extend(ids)
+            else:
+                rows[2 * row:2 * row + 2] = array("I", ids)
+        return type(self)(index, strings, rows)
+
+    def __getitem__(self, name):
+        row = self._index[name] * 2
+        return [self._strings[self._rows[row]], self._strings[self._rows[row + 1]]]
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def resident_size(self):
+        """估算常驻内存：名称表、去重后的字符串表和下标数组"""
+        if self._resident is None:
+            self._resident = (sys.getsizeof(self._index) + sum(sys.getsizeof(name) for name in self._index)
+                              + sys.getsizeof(self._strings) + sum(sys.getsizeof(text) for text in self._strings)
+                              + sys.getsizeof(len(self._index)) * len(self._index)  # 行号整数
+                              + self._rows.itemsize * len(self._rows))
+        return self._resident
+
+    def dict_size(self):
+        """估算同样内容用普通字典（每行一个列表、字符串不去重）保存时占用的内存"""
+        uses = [0] * len(self._strings)
+        for i in self._rows:
+            uses[i] += 1
+        strings = sum(sys.getsizeof(text) * count for text, count in zip(self._strings, uses))
+        return (sys.getsizeof(self._index) + sum(sys.getsizeof(name) for name in self._index)
+                + strings + sys.getsizeof(["", ""]) * len(self._index))
+
+
+class AppendCheckpoint:
+    """
+    记录已解析到的位置，供只在末尾追加内容的CSV增量重新加载。
+    parsed_bytes 总是落在完整行之后（换行符之后且引号已闭合），prefix_hash 是这部分字节的哈希。
+    """
+
+    __slots__ = ("parsed_bytes", "prefix_hash", "encoding", "base_bytes")
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, parsed_bytes, prefix_hash, encoding, base_bytes=0):
+        self.parsed_bytes = parsed_bytes
+        self.prefix_hash = prefix_hash
+        self.encoding = encoding
+        # 增量解析时为上一个检查点的位置，完整解析时为 0
+        self.base_bytes = base_bytes
+
+    @staticmethod
+    def row_boundary(data):
+        """返回最后一个完整行之后的偏移：从末尾向前找引号数为偶数的换行符（\n 或单独的 \r）"""
+        quotes = data.count(b'"')
+        end = len(data)
+        while True:
+            pos = max(data.rfind(b"\n", 0, end), data.rfind(b"\r", 0, end))
+            if pos < 0:
+                return 0
+            quotes -= data.count(b'"', pos + 1, end)
+            if quotes % 2 == 0:
+                return pos + 1
+            end = pos
+
+    @classmethod
+    def extend(cls, digest, parsed_bytes, data, encoding):
+        """在已有前缀哈希的基础上追加 data，返回新的检查点。
+
+        data 必须以完整行结束：目录里包含从 data 全部字节解析出的行，如果检查点停在中间，
+        之后被修改的末尾几行不会被哈希校验，旧的风格会残留在增量结果中。此时返回 None，下次完整重新解析。
+        """
+        boundary = cls.row_boundary(data)
+        if boundary != len(data):
+            return None
+        digest.update(data)
+        return cls(parsed_bytes + boundary, digest.digest(), encoding, parsed_bytes)
+
+    @classmethod
+    def create(cls, data, encoding):
+        # UTF-16 中换行符不是单字节，无法按字节定位行边界
+        if encoding is None or encoding == "utf-16":
+            return None
+        checkpoint = cls.extend(hashlib.sha1(), 0, data, encoding)
+        # 连标题行都没有完整结束时，追加的内容会被当作包含标题的整个文件，只能完整重新解析
+        if checkpoint is None or checkpoint.parsed_bytes == 0:
+            return None
+        return checkpoint
+
+    @property
+    def tail_encoding(self):
+        # BOM 只出现在文件开头，追加部分按普通 UTF-8 解码
+        return "utf-8" if self.encoding == "utf-8-sig" else self.encoding
+
+    def matches_prefix(self, f):
+        """分块读取并校验文件开头 parsed_bytes 字节，返回哈希对象，不匹配时返回 None"""
+        digest = hashlib.sha1()
+        remaining = self.parsed_bytes
+        while remaining:
+            chunk = f.read(min(self.CHUNK_SIZE, remaining))
+            if not chunk:
+                return None
+            digest.update(chunk)
+            remaining -= len(chunk)
+        return digest if digest.digest() == self.prefix_hash else None
+
+
+class _CatalogEntry:
+    """风格目录缓存中的一个条目"""
+
+    __slots__ = ("fingerprint", "styles", "size", "encoding", "checkpoint", "derived")
+
+    def __init__(self, fingerprint, styles, size, encoding=None, checkpoint=None):
+        self.fingerprint = fingerprint
+        self.styles = styles
+        self.size = size
+        self.encoding = encoding
+        # 增量重新加载使用的检查点；普通字典和紧凑目录才有，延迟加载目录和旁路索引为 None
+        self.checkpoint = checkpoint
+        # 由风格数据派生、随条目一起失效的数据（如分词结果、名称索引）
+        self.derived = {}
+
+
+class StyleCatalogCache:
+    """
+    进程级的风格目录缓存，两个加载节点共用。
+    以 (路径, mtime_ns, 大小) 作为文件指纹，文件未变化时直接返回已解析的结果；
+    按最近使用顺序淘汰，并限制条目数与估算内存占用。
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 路径 -> _CatalogEntry
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(path):
+        """返回文件指纹 (绝对路径, mtime_ns, 大小)，文件不存在时返回 None"""
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def estimate_size(styles):
+        """粗略估算风格字典占用的内存"""
+        if hasattr(styles, "resident_size"):
+            return styles.resident_size()
+        total = sys.getsizeof(styles)
+        for name, (positive, negative) in styles.items():
+            total += sys.getsizeof(name) + sys.getsizeof(positive) + sys.getsizeof(negative) + 72
+        return total
+
+    def get(self, path):
+        """获取路径对应的风格字典，文件未变化时命中缓存"""
+        fp = self.fingerprint(path) if path else None
+        if fp is None:
+            # 文件不存在，交给加载函数输出错误信息
+            return StylesCSVLoader.load_styles_csv(path)
+
+        key = fp[0]
+        encoding_hint = None
+        previous = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint == fp:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    STATS.incr("catalog_cache_hits")
+                    return entry.styles
+                # 文件已变化，沿用上次检测到的编码；文件变大时尝试只解析追加的部分
+                encoding_hint = entry.encoding
+                if entry.checkpoint is not None and fp[2] > entry.fingerprint[2]:
+                    previous = (entry.styles, entry.checkpoint)
+            self.misses += 1
+        STATS.incr("catalog_cache_misses")
+
+        styles, encoding, checkpoint = self.load(path, fp, encoding_hint, previous)
+        size = None
+        if previous is not None and checkpoint is not None and 0 < checkpoint.base_bytes == previous[1].parsed_bytes:
+            # 增量解析时按字节数比例估算内存，避免为几行新增内容遍历整个目录
+            size = int(entry.size * checkpoint.parsed_bytes / checkpoint.base_bytes)
+        self.put(fp, styles, encoding, checkpoint, size)
+        return styles
+
+    @staticmethod
+    def use_sidecar(fp):
+        """是否为该文件使用二进制索引：auto 时只对大文件启用"""
+        if SIDECAR_MODE in ("1", "always"):
+            return True
+        if SIDECAR_MODE == "auto":
+            return fp[2] >= SIDECAR_MIN_BYTES
+        return False
+
+    def load(self, path, fp, encoding_hint=None, previous=None):
+        """按配置解析CSV或打开二进制索引，返回 (风格映射, 编码, 增量检查点)"""
+        if self.use_sidecar(fp):
+            return StyleSidecarIndex.open_or_build(path, fp, encoding_hint) + (None,)
+        if LAZY_CATALOG:
+            styles, encoding, checkpoint = LazyStyleCatalog.load(path, encoding_hint) + (None,)
+        else:
+            styles, encoding, checkpoint = StylesCSVLoader.read_styles_csv_resumable(path, encoding_hint, previous)
+        # 完整解析得到的字典转为紧凑存储，加载失败的占位字典除外
+        if COMPACT_CATALOG and type(styles) is dict and encoding is not None:
+            with STATS.timed("compact_catalog"):
+                styles = CompactStyleCatalog.from_dict(styles)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Compacted %s: %.1f MB as dict -> %.1f MB, %d unique prompts in %d rows",
+                             path, styles.dict_size() / 1e6, styles.resident_size() / 1e6,
+                             len(styles._strings), len(styles))
+        return styles, encoding, checkpoint
+
+    def put(self, fp, styles, encoding=None, checkpoint=None, size=None):
+        if size is None:
+            size = self.estimate_size(styles)
+        with self._lock:
+            old = self._entries.pop(fp[0], None)
+            if old is not None:
+                self._total_bytes -= old.size
+            self._entries[fp[0]] = _CatalogEntry(fp, styles, size, encoding, checkpoint)
+            self._total_bytes += size
+            # 淘汰最久未使用的条目，但至少保留刚加入的这一个
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+
+    def invalidate(self, path=None):
+        """移除指定路径的缓存，不传路径时清空全部"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+            entry = self._entries.pop(os.path.abspath(path), None)
+            if entry is not None:
+                self._total_bytes -= entry.size
+
+    def peek(self, path, fp=None):
+        """返回已缓存的风格映射，不加载文件；给出 fp 时只在指纹一致时返回"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            if entry is None or (fp is not None and entry.fingerprint != fp):
+                return None
+            return entry.styles
+
+    def encoding_of(self, path):
+        """返回缓存中记录的文件编码"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            return entry.encoding if entry is not None else None
+
+    def derived(self, styles, name, factory):
+        """返回挂在 styles 所属缓存条目上的派生数据，不存在时用 factory() 创建。
+        styles 不在缓存中（例如加载失败）时每次都创建新的。
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.styles is styles:
+                    value = entry.derived.get(name)
+                    if value is None:
+                        value = entry.derived[name] = factory()
+                    return value
+        # 不在缓存中的映射（如合并目录）可以自带派生数据
+        own = getattr(styles, "derived", None)
+        if isinstance(own, dict):
+            value = own.get(name)
+            if value is None:
+                value = own[name] = factory()
+            return value
+        return factory()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# 二进制索引的使用方式：never（默认）、auto（只用于大文件）、always，可通过环境变量 STYLES_CSV_SIDECAR 配置
+# 索引写在CSV旁边，默认关闭以免在其他节点包的目录里生成文件
+SIDECAR_MODE = os.environ.get("STYLES_CSV_SIDECAR", "never").lower()
+SIDECAR_MIN_BYTES = int(os.environ.get("STYLES_CSV_SIDECAR_MIN_BYTES", 4 * 1024 * 1024))
+# 按需解码模式：只索引风格名，提示词在执行时才读取，可通过环境变量 STYLES_CSV_LAZY=1 开启
+LAZY_CATALOG = os.environ.get("STYLES_CSV_LAZY", "0").lower() in ("1", "true", "yes")
+# 是否把解析后的目录转为去重的紧凑存储，可通过环境变量 STYLES_CSV_COMPACT=0 关闭
+COMPACT_CATALOG = os.environ.get("STYLES_CSV_COMPACT", "1").lower() in ("1", "true", "yes")
+
+# 全局共享的风格目录缓存
+STYLE_CATALOG_CACHE = StyleCatalogCache()
+
+
+class CSVDiscoveryIndex:
+    """
+    基于 os.scandir 的CSV文件发现索引。
+    跳过已知的大目录（.git、node_modules、模型目录等），支持包含/排除通配符；
+    缓存每个目录的 mtime，重新扫描时只列出内容发生变化的目录。
+    """
+
+    DEFAULT_SKIP_DIRS = {
+        ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+        "site-packages", ".cache", ".mypy_cache", ".pytest_cache", ".idea", ".vscode",
+        "models", "checkpoints", "weights", "ckpts", "loras",
+    }
+
+    def __init__(self, skip_dirs=None, include_globs=None, exclude_globs=None):
+        self.skip_dirs = set(self.DEFAULT_SKIP_DIRS if skip_dirs is None else skip_dirs)
+        # 通配符匹配相对于 base_path 的路径（使用 / 分隔）
+        self.include_globs = list(include_globs or ["*.csv"])
+        self.exclude_globs = list(exclude_globs or [])
+        self.last_scan_stats = {}
+        self._dirs = {}  # 目录 -> (mtime_ns, CSV文件列表, 子目录列表)
+        self._lock = threading.Lock()
+
+    def _is_excluded(self, relative_path):
+        return any(fnmatch(relative_path, pattern) for pattern in self.exclude_globs)
+
+    def _is_included(self, relative_path):
+        return any(fnmatch(relative_path, pattern) or fnmatch(os.path.basename(relative_path), pattern)
+                   for pattern in self.include_globs)
+
+    def _list_dir(self, directory, base_path):
+        """列出单个目录，返回 (CSV文件列表, 子目录列表, 访问的条目数)"""
+        files, subdirs, visited = [], [], 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                visited += 1
+                relative_path = os.path.relpath(entry.path, base_path).replace(os.sep, "/")
+                # 与 os.walk 默认行为一致，不进入符号链接目录
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.skip_dirs and not self._is_excluded(relative_path):
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(".csv") and entry.is_file():
+                    if self._is_included(relative_path) and not self._is_excluded(relative_path):
+                        files.append(entry.path)
+        return files, subdirs, visited
+
+    def scan(self, root, base_path=None):
+        """扫描 root 下的CSV文件，未变化的目录直接使用缓存的列表"""
+        base_path = base_path or root
+        start = time.perf_counter()
+        visited = rescanned = 0
+        seen = set()
+        results = []
+        with self._lock:
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(directory)
+                visited += 1
+                cached = self._dirs.get(directory)
+                if cached is not None and cached[0] == mtime:
+                    files, subdirs = cached[1], cached[2]
+                else:
+                    try:
+                        files, subdirs, count = self._list_dir(directory, base_path)
+                    except OSError:
+                        continue
+                    visited += count
+                    rescanned += 1
+                    self._dirs[directory] = (mtime, files, subdirs)
+                results.extend(files)
+                stack.extend(subdirs)
+
+            # 清理已经不存在或不再访问的目录
+            for directory in [d for d in self._dirs
+                              if d not in seen and (d == root or d.startswith(root + os.sep))]:
+                del self._dirs[directory]
+
+            self.last_scan_stats = {
+                "root": root,
+                "seconds": time.perf_counter() - start,
+                "entries_visited": visited,
+                "dirs_rescanned": rescanned,
+                "csv_files": len(results),
+            }
+        STATS.record("find_csv_files.scan", self.last_scan_stats["seconds"])
+        STATS.incr("discovery_entries_visited", visited)
+        logger.debug("Scanned %s in %.3fs: %d entries visited, %d directories rescanned, %d CSV files found.",
+                     root, self.last_scan_stats["seconds"], visited, rescanned, len(results))
+        return sorted(results)
+
+    def invalidate(self):
+        with self._lock:
+            self._dirs.clear()
+
+
+# 全局CSV发现索引，可通过环境变量 STYLES_CSV_INCLUDE / STYLES_CSV_EXCLUDE /
+# STYLES_CSV_SKIP_DIRS 配置（逗号分隔的通配符或目录名）
+CSV_DISCOVERY_INDEX = CSVDiscoveryIndex(
+    skip_dirs=CSVDiscoveryIndex.DEFAULT_SKIP_DIRS | set(_env_list("STYLES_CSV_SKIP_DIRS")),
+    include_globs=_env_list("STYLES_CSV_INCLUDE"),
+    exclude_globs=_env_list("STYLES_CSV_EXCLUDE"),
+)
+
+
+# 容错解析时未加引号字段的结束位置
+_FIELD_END_RE = re.compile(r"[,\r\n]")
+
+# 加载失败时返回的占位风格名
+ERROR_STYLE_NAME = "Error loading styles.csv, check the console"
+
+
+class MergedStyles(Mapping):
+    """合并目录的只读视图：键为 "来源文件 :: 风格名"，值从各文件的目录中按需读取"""
+
+    def __init__(self, sources, conflicts=None, pending=None, failed=None):
+        self._sources = sources  # 合并后的名称 -> (来源目录, 原风格名)
+        self.conflicts = conflicts or {}  # 风格名 -> 出现该名称的文件列表
+        self.pending = pending or []  # 尚未加载完成的文件
+        self.failed = failed or {}  # 加载失败的文件 -> 原因
+        self.derived = {}
+
+    def __getitem__(self, name):
+        source, style = self._sources[name]
+        return source[style]
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def __iter__(self):
+        return iter(self._sources)
+
+    def __len__(self):
+        return len(self._sources)
+
+    def keys(self):
+        return self._sources.keys()
+
+
+class MergedStyleCatalog:
+    """
+    把所有发现的CSV并行加载后合并为一个目录，风格名以来源文件为前缀。
+    每次最多等待 file_timeout 秒，出错的文件被跳过，未加载完的大文件在后台继续加载，
+    下一次请求时再并入目录，不会拖慢其他文件。
+    """
+
+    SEPARATOR = " :: "
+
+    def __init__(self, max_workers=4, file_timeout=10.0):
+        self.file_timeout = file_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="styles_csv_merge")
+        self._pending = {}  # 路径 -> 仍在加载的 future
+        self._merged = None
+        self._merged_key = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._merged = None
+            self._merged_key = None
+
+    def get(self, csv_files):
+        """返回合并目录；csv_files 为 find_csv_files() 的结果"""
+        files = [(name, path) for name, path in csv_files.items() if path]
+        key = tuple((name, STYLE_CATALOG_CACHE.fingerprint(path)) for name, path in files)
+        with self._lock:
+            if key == self._merged_key and self._merged is not None:
+                return self._merged
+            # 新提交的加载任务立即登记，并发的请求会复用而不是重复加载
+            futures = []
+            submitted = []
+            for name, path in files:
+                future = self._pending.get(path)
+                if future is None:
+                    future = self._pending[path] = self._executor.submit(STYLE_CATALOG_CACHE.get, path)
+                    submitted.append(future)
+                futures.append((name, path, future))
+
+        # 只等待本次新提交的文件，之前仍未完成的文件不再重复等待；等待时不持有锁
+        if submitted:
+            with STATS.timed("merged_catalog.load"):
+                concurrent.futures.wait(submitted, timeout=self.file_timeout)
+
+        sources = {}
+        owners = {}
+        pending = []
+        failed = {}
+        for name, path, future in futures:
+            if not future.done():
+                pending.append(name)
+                continue
+            error = future.exception()
+            if error is not None:
+                failed[name] = str(error)
+                continue
+            styles = future.result()
+            if ERROR_STYLE_NAME in styles:
+                failed[name] = "failed to load, check the log"
+                continue
+            for style in styles.keys():
+                sources[f"{name}{self.SEPARATOR}{style}"] = (styles, style)
+                owners.setdefault(style, []).append(name)
+
+        conflicts = {style: names for style, names in owners.items() if len(names) > 1}
+        if conflicts:
+            logger.info("合并目录中有 %d 个风格名出现在多个文件中，已按来源文件区分", len(conflicts))
+        if pending:
+            logger.warning("以下CSV文件仍在加载，暂未并入合并目录: %s", ", ".join(pending))
+        for name, reason in failed.items():
+            logger.warning("合并目录跳过了加载失败的文件 %s: %s", name, reason)
+
+        merged = MergedStyles(sources, conflicts, pending, failed)
+        if not sources:
+            merged = MergedStyles({ERROR_STYLE_NAME: ({ERROR_STYLE_NAME: ["", ""]}, ERROR_STYLE_NAME)})
+        with self._lock:
+            for _, path, future in futures:
+                if future.done() and self._pending.get(path) is future:
+                    del self._pending[path]
+            # 还有文件没加载完时不缓存，下次请求会把它们并进来
+            if not pending:
+                self._merged = merged
+                self._merged_key = key
+        return merged
+
+
+# 在CSV选项中代表合并目录的名称
+MERGED_CATALOG_KEY = "全部CSV文件 (合并)"
+# 是否启用合并目录模式，可通过环境变量 STYLES_CSV_MERGED=1 开启
+MERGED_CATALOG_ENABLED = os.environ.get("STYLES_CSV_MERGED", "0").lower() in ("1", "true", "yes")
+MERGED_CATALOG = MergedStyleCatalog(
+    file_timeout=float(os.environ.get("STYLES_CSV_MERGE_TIMEOUT", 10.0)),
+)
+
+
+def csv_file_choices(csv_files):
+    """节点中CSV文件下拉框的选项，合并模式下合并目录排在最前并作为默认值"""
+    names = list(csv_files.keys())
+    if MERGED_CATALOG_ENABLED and any(csv_files.values()):
+        names.insert(0, MERGED_CATALOG_KEY)
+    return names
+
+
+def resolve_catalog(csv_files, csv_file, fallback_path=""):
+    """返回节点所选CSV（或合并目录）的风格映射"""
+    if csv_file == MERGED_CATALOG_KEY:
+        return MERGED_CATALOG.get(csv_files)
+    return STYLE_CATALOG_CACHE.get(csv_files.get(csv_file, fallback_path))
+
+
+def invalidate_catalog(csv_files, csv_file, fallback_path=""):
+    """丢弃所选CSV（或合并目录）的缓存，强制重新解析"""
+    if csv_file == MERGED_CATALOG_KEY:
+        STYLE_CATALOG_CACHE.invalidate()
+        MERGED_CATALOG.invalidate()
+    else:
+        STYLE_CATALOG_CACHE.invalidate(csv_files.get(csv_file, fallback_path))
+
+
+def catalog_fingerprint(csv_files, csv_file, fallback_path="", styles=None):
+    """IS_CHANGED 使用的指纹。
+
+    给出风格名时（且 HASH_SELECTED_ROWS 开启）返回这些行内容的哈希，编辑其他行不会让节点重新执行；
+    否则返回文件的 mtime_ns 和大小（合并目录为所有文件指纹的哈希）。
+    文件未变化时只需 stat，目录直接命中缓存。
+    """
+    if csv_file == MERGED_CATALOG_KEY:
+        fingerprints = [STYLE_CATALOG_CACHE.fingerprint(path) for path in csv_files.values() if path]
+        file_key = hashlib.sha1(repr(fingerprints).encode("utf-8")).hexdigest()
+    else:
+        fp = STYLE_CATALOG_CACHE.fingerprint(csv_files.get(csv_file, fallback_path) or "")
+        if fp is None:
+            return "missing"
+        file_key = f"{fp[1]}:{fp[2]}"
+    if not styles or not HASH_SELECTED_ROWS:
+        return file_key
+    styles_csv = resolve_catalog(csv_files, csv_file, fallback_path)
+    digest = hashlib.sha1()
+    for name in styles:
+        digest.update(name.encode("utf-8") + b"\0")
+        for part in styles_csv.get(name) or ():
+            digest.update(part.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+# IS_CHANGED 是否只比较所选风格的内容（否则比较整个文件的 mtime 和大小）
+HASH_SELECTED_ROWS = os.environ.get("STYLES_CSV_HASH_SELECTED_ROWS", "1").lower() in ("1", "true", "yes")
+
+
+class CSVWatcher:
+    """
+    后台轮询已发现CSV文件的指纹。已在目录缓存中的文件变化时在后台线程中重新加载，
+    并通过 PromptServer 向前端推送新增和删除的风格名，前端据此原地更新下拉框。
+    没有被节点加载过的CSV（例如其他节点包的数据文件）只比较指纹，不会被解析。
+    连续没有变化时轮询间隔逐渐加长（最长 max_interval），检测到变化后恢复初始间隔。
+    """
+
+    EVENT = "styles_csv_loader.catalog_changed"
+    # 单次推送的最大名称数，超过时只通知前端重新拉取列表
+    MAX_DIFF_NAMES = 2000
+
+    def __init__(self, interval=2.0, max_interval=30.0, backoff=1.5):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._files = {}  # 显示名称 -> 路径
+        self._snapshots = {}  # 路径 -> (指纹, 风格名集合；文件不在缓存中时为 None)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def watch(self, csv_files):
+        """更新监视的文件列表（find_csv_files 的结果），首次调用时启动后台线程"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._files = {name: path for name, path in csv_files.items() if path}
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="styles_csv_watcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
             try:
-                from deep_translator import GoogleTranslator
-                translator = GoogleTranslator(source='zh-cn', target='en')
-                return translator.translate(text)
-            except ImportError:
-                # 如果两个库都没有安装，使用简单的词典映射
-                print("没有安装翻译库，使用简单的映射转换")
-                # 中文常见词汇的简单映射表
-                chinese_to_english = {
-                    "人物": "person",
-                    "美女": "beautiful girl",
-                    "帅哥": "handsome man",
-                    "风景": "landscape",
-                    "动物": "animal",
-                    "猫": "cat",
-                    "狗": "dog",
-                    "树": "tree",
-                    "花": "flower",
-                    "山": "mountain",
-                    "水": "water",
-                    "天空": "sky",
-                    "云": "cloud",
-                    "太阳": "sun",
-                    "月亮": "moon",
-                    "星星": "star",
-                    "房子": "house",
-                    "车": "car",
-                    "道路": "road",
-                    "城市": "city",
-                    "农村": "countryside",
-                    "高质量": "high quality",
-                    "精致": "exquisite",
-                    "细节": "detail",
-                    "真实": "realistic",
-                    "照片": "photo",
-                    "模糊": "blur",
-                    "扭曲": "distortion",
-                    "噪点": "noise",
-                    "画质差": "bad quality",
-                    "低分辨率": "low resolution",
-                    "不要": "no",
-                    "去除": "remove",
-                    "添加": "add",
-                    "增强": "enhance",
-                    "减弱": "reduce",
-                    "风格": "style",
-                    "写实": "realistic",
-                    "卡通": "cartoon",
-                    "动漫": "anime",
-                    "油画": "oil painting",
-                    "水彩": "watercolor",
-                    "素描": "sketch",
-                    "简约": "minimalist",
-                    "复古": "vintage",
-                    "未来": "futuristic",
-                    "科幻": "sci-fi",
-                    "奇幻": "fantasy",
-                    "恐怖": "horror",
-                    "可爱": "cute",
-                    "优雅": "elegant",
-                    "华丽": "gorgeous",
-                    "黑暗": "dark",
-                    "明亮": "bright",
-                    "柔和": "soft",
-                    "强烈": "strong",
-                    "日系": "Japanese style",
-                    "中国风": "Chinese style",
-                    "西方": "Western style",
-                    "古代": "ancient",
-                    "现代": "modern",
-                    "未来": "future",
-                }
-                
-                # 使用词典映射替换文本中的中文词汇
-                for cn, en in chinese_to_english.items():
-                    text = text.replace(cn, en)
-                
-                # 如果文本未被完全转换（仍然包含中文字符）
-                if any(u'\u4e00' <= char <= u'\u9fff' for char in text):
-                    print(f"警告：文本包含未能翻译的中文字符，建议安装翻译库以获得更好的效果。")
-                
-                return text
-                
-    except Exception as e:
-        print(f"翻译过程中出错: {e}")
-        return text  # 出错时返回原文
-   
+                changed = self.poll()
+            except Exception:
+                logger.exception("CSV文件监视出错")
+                changed = False
+            delay = self.interval if changed else min(delay * self.backoff, self.max_interval)
+
+    def poll(self):
+        """检查一遍所有文件，返回是否有文件发生变化"""
+        with self._lock:
+            files = dict(self._files)
+        changed = False
+        for name, path in files.items():
+            fp = STYLE_CATALOG_CACHE.fingerprint(path)
+            previous = self._snapshots.get(path)
+            if previous is not None and previous[0] == fp:
+                if previous[1] is None:
+                    # 文件之后被节点加载过，趁缓存里是当前版本时记下风格名，不会触发解析
+                    styles = STYLE_CATALOG_CACHE.peek(path, fp)
+                    if styles is not None:
+                        self._snapshots[path] = (fp, frozenset(styles.keys()))
+                continue
+            if fp is None:
+                self._snapshots.pop(path, None)
+                if previous is not None:
+                    self.send({"csv_file": name, "deleted": True})
+                    changed = True
+                continue
+            # 只重新加载已在缓存中的文件，其余文件只记录指纹
+            if previous is None or previous[1] is None or STYLE_CATALOG_CACHE.peek(path) is None:
+                styles = STYLE_CATALOG_CACHE.peek(path, fp)
+                self._snapshots[path] = (fp, frozenset(styles.keys()) if styles is not None else None)
+                continue
+            with STATS.timed("watcher.reload"):
+                names = frozenset(STYLE_CATALOG_CACHE.get(path).keys())
+            self._snapshots[path] = (fp, names)
+            changed = True
+            old = previous[1]
+            added = sorted(names - old)
+            removed = sorted(old - names)
+            logger.info("%s 已变化: 新增 %d, 删除 %d", name, len(added), len(removed))
+            STATS.incr("watcher_changes")
+            self.send(self.diff_event(name, added, removed, len(names)))
+        return changed
+
+    def diff_event(self, name, added, removed, total):
+        event = {"csv_file": name, "total": total}
+        if MERGED_CATALOG_ENABLED:
+            event["merged_file"] = MERGED_CATALOG_KEY
+            event["merged_prefix"] = name + MergedStyleCatalog.SEPARATOR
+        if len(added) + len(removed) > self.MAX_DIFF_NAMES:
+            event["reload"] = True
+        else:
+            event.update(added=added, removed=removed)
+        return event
+
+    def send(self, event):
+        server = PromptServer.instance
+        if server is not None:
+            server.send_sync(self.EVENT, event)
+
+
+# 轮询间隔（秒），设为 0 关闭文件监视
+CSV_WATCHER = CSVWatcher(
+    interval=float(os.environ.get("STYLES_CSV_WATCH_INTERVAL", 2.0)),
+    max_interval=float(os.environ.get("STYLES_CSV_WATCH_MAX_INTERVAL", 30.0)),
+)
+
+
 class StylesCSVLoader:
     """
     Loads csv file with styles. For migration purposes from automatic11111 webui.
     """
     
+    # 没有BOM且不是合法UTF-8时，按顺序尝试的中文编码（gb2312是gbk的子集，无需单独尝试）
+    CJK_ENCODINGS = ["gbk", "gb18030", "big5"]
+    # 用于猜测编码的样本大小
+    ENCODING_SAMPLE_SIZE = 64 * 1024
+
     @staticmethod
-    def load_styles_csv(styles_path: str):
-        """Loads csv file with styles. It has only one column.
-        Ignore the first row (header).
-        positive_prompt are strings separated by comma. Each string is a prompt.
-        negative_prompt are strings separated by comma. Each string is a prompt.
+    def encoding_candidates(data: bytes, encoding_hint=None):
+        """只根据文件开头的样本，按可能性依次产出候选编码，不做完整解码。
+
+        顺序为：BOM -> UTF-8校验 -> 上次记录的编码 -> 按样本得分排序的中文编码。
+        样本解码失败的编码直接跳过；是生成器，前面的候选被采用时后面的打分不会执行。
+        """
+        if data.startswith(codecs.BOM_UTF8):
+            yield "utf-8-sig"
+            return
+        if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+            yield "utf-16"
+            return
+
+        sample = data[:StylesCSVLoader.ENCODING_SAMPLE_SIZE]
+        is_complete = len(sample) == len(data)
+
+        def decode_sample(encoding):
+            STATS.incr("encoding_attempts")
+            try:
+                # 增量解码器允许样本末尾截断半个字符
+                return codecs.getincrementaldecoder(encoding)().decode(sample, final=is_complete)
+            except (UnicodeDecodeError, LookupError):
+                return None
+
+        def cjk_score(text):
+            # 非ASCII字符中常用汉字和全角标点所占比例，乱码时比例明显偏低
+            non_ascii = [c for c in text if ord(c) > 127]
+            if not non_ascii:
+                return 1.0
+            good = sum(1 for c in non_ascii
+                       if "\u4e00" <= c <= "\u9fff" or "\u3000" <= c <= "\u303f" or "\uff00" <= c <= "\uffef")
+            return good / len(non_ascii)
+
+        tried = set()
+        # UTF-8校验很可靠，先于上次记录的编码
+        for encoding in ("utf-8", encoding_hint):
+            if encoding and encoding not in tried and encoding not in ("utf-8-sig", "utf-16"):
+                tried.add(encoding)
+                if decode_sample(encoding) is not None:
+                    yield encoding
+
+        # 中文编码之间常常都能解码成功，按样本得分排序，同分时保持原有顺序
+        scored = []
+        for index, encoding in enumerate(StylesCSVLoader.CJK_ENCODINGS):
+            if encoding in tried:
+                continue
+            text = decode_sample(encoding)
+            if text is not None:
+                scored.append((-cjk_score(text), index, encoding))
+        for _, _, encoding in sorted(scored):
+            yield encoding
+
+    @staticmethod
+    def detect_encoding(data: bytes, encoding_hint=None):
+        """判断编码但不保留解码后的文本：候选按样本排序，再用增量解码器分块校验整个缓冲区。
+
+        样本之外才出现的非ASCII字节（例如前面都是英文风格名的GBK文件）也能被发现。
+        所有候选都失败时返回 None。
+        """
+        for encoding in StylesCSVLoader.encoding_candidates(data, encoding_hint):
+            if encoding in ("utf-8-sig", "utf-16"):
+                return encoding
+            STATS.incr("encoding_attempts")
+            decoder = codecs.getincrementaldecoder(encoding)()
+            view = memoryview(data)
+            chunk_size = 1024 * 1024
+            try:
+                for start in range(0, len(data), chunk_size):
+                    decoder.decode(view[start:start + chunk_size], final=start + chunk_size >= len(data))
+                if not data:
+                    decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                continue
+            return encoding
+        return None
+
+    @staticmethod
+    def decode_styles_bytes(data: bytes, encoding_hint=None):
+        """在内存中对原始字节只判断一次编码并解码。
+
+        候选编码来自 encoding_candidates，整个缓冲区只对可能的编码做完整解码，
+        某个候选完整解码成功后直接返回，不再为后面的编码打分。
 
         Returns:
-            list: List of styles. Each style is a dict with keys: style_name and value: [positive_prompt, negative_prompt]
+            tuple: (解码后的文本, 使用的编码)
+        """
+        for encoding in StylesCSVLoader.encoding_candidates(data, encoding_hint):
+            if encoding == "utf-8-sig":
+                return data[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace"), encoding
+            if encoding == "utf-16":
+                return data.decode("utf-16", errors="replace"), encoding
+            STATS.incr("encoding_attempts")
+            try:
+                return data.decode(encoding), encoding
+            except UnicodeDecodeError:
+                continue
+
+        # 所有编码都失败，用替换模式强制解码
+        return data.decode("utf-8", errors="replace"), "utf-8"
+
+    @staticmethod
+    def parse_styles_text(text: str, skip_header=True):
+        """把解码后的CSV文本解析为风格字典，默认跳过标题行（解析追加的部分时不跳过）"""
+        styles_dict = {}
+        try:
+            # 使用csv模块解析，这样可以更好地处理引号和逗号的问题
+            reader = csv.reader(io.StringIO(text, newline=""))
+            if skip_header:
+                next(reader, None)  # 跳过标题行
+            for row in reader:
+                if len(row) >= 3:  # 确保行至少有3列
+                    style_name = row[0].strip()
+                    positive = row[1].strip()
+                    negative = row[2].strip() if len(row) > 2 else ""
+                    styles_dict[style_name] = [positive, negative]
+        except csv.Error as e:
+            logger.warning("CSV parse error: %s, falling back to lenient parsing", e)
+            styles_dict = {}
+            bad_rows = []
+            rows = StylesCSVLoader.iter_lenient_rows(text)
+            if skip_header:
+                next(rows, None)  # 跳过标题行
+            for line_no, row, problem in rows:
+                if len(row) >= 3:
+                    styles_dict[row[0].strip()] = [row[1].strip(), row[2].strip()]
+                elif row:
+                    problem = problem or f"expected 3 columns, got {len(row)}"
+                if problem:
+                    bad_rows.append((line_no, problem))
+            if bad_rows:
+                STATS.incr("bad_rows", len(bad_rows))
+                logger.warning("%d malformed rows: %s%s", len(bad_rows),
+                               "; ".join(f"line {line_no}: {problem}" for line_no, problem in bad_rows[:20]),
+                               " ..." if len(bad_rows) > 20 else "")
+        return styles_dict
+
+    @staticmethod
+    def iter_lenient_rows(text: str):
+        """容错的CSV逐行解析器，只扫描一遍文本，逐条产出 (起始行号, 字段列表, 问题说明或None)。
+
+        支持引号内的逗号、换行和 "" 转义，\r\n、\r、\n 混用均视为换行。
+        引号闭合后紧跟其他字符时，把剩余内容接到字段后面；跨行的引号字段闭合后紧跟其他字符，
+        或一直没有闭合时，视为多余的引号，按普通字符从这一行重新解析，不会吞掉后面的行。
+        行号从传入文本的第一行开始计数。
+        """
+        n = len(text)
+        pos = 0
+        line = 1
+        row = []
+        row_line = 1
+        row_start = 0
+        problem = None
+        while True:
+            field_start = pos
+            if pos < n and text[pos] == '"':
+                parts = []
+                j = pos + 1
+                while True:
+                    k = text.find('"', j)
+                    if k < 0:
+                        break
+                    parts.append(text[j:k])
+                    if text.startswith('"', k + 1):
+                        parts.append('"')
+                        j = k + 2
+                        continue
+                    break
+                quoted = text[pos:k + 1] if k >= 0 else text[pos:]
+                breaks = quoted.count("\n") + quoted.count("\r") - quoted.count("\r\n")
+                follow = text[k + 1:k + 2] if k >= 0 else ""
+                if k >= 0 and (follow in ("", ",", "\r", "\n") or not breaks):
+                    # 正常闭合，或同一行内闭合后还有内容
+                    line += breaks
+                    pos = k + 1
+                    value = "".join(parts)
+                    if follow not in ("", ",", "\r", "\n"):
+                        m = _FIELD_END_RE.search(text, pos)
+                        end = m.start() if m else n
+                        value += text[pos:end]
+                        pos = end
+                        problem = problem or "unexpected characters after closing quote"
+                    row.append(value)
+                else:
+                    # 引号没有闭合，或闭合在后面的行中：开头的引号按普通字符处理
+                    problem = problem or "unbalanced quote"
+                    m = _FIELD_END_RE.search(text, pos + 1)
+                    pos = m.start() if m else n
+                    row.append(text[field_start:pos])
+            else:
+                m = _FIELD_END_RE.search(text, pos)
+                pos = m.start() if m else n
+                row.append(text[field_start:pos])
+                if '"' in row[-1]:
+                    problem = problem or "stray quote"
+
+            if pos < n and text[pos] == ",":
+                pos += 1
+                continue
+            # 行结束
+            if pos >= n:
+                if row != [""]:
+                    yield row_line, row, problem
+                return
+            # 与 csv 模块一致，空行产出空列表
+            if pos == row_start:
+                row = []
+            pos += 2 if text.startswith("\r\n", pos) else 1
+            line += 1
+            yield row_line, row, problem
+            row = []
+            row_line = line
+            row_start = pos
+            problem = None
+
+    @staticmethod
+    def read_styles_csv(styles_path: str, encoding_hint=None):
+        """读取一次文件并解析，同时返回检测到的编码，供缓存记录后下次跳过检测。
+
+        Returns:
+            tuple: (风格字典, 编码)。加载失败时编码为 None
+        """
+        return StylesCSVLoader.read_styles_csv_resumable(styles_path, encoding_hint)[:2]
+
+    @staticmethod
+    def read_styles_tail(f, previous):
+        """文件只在末尾追加了内容时，只解码和解析追加的部分并合并到上次的结果中。
+
+        开头已解析的部分只做哈希校验；被修改过或追加部分无法按原编码解码时返回 None，由调用方完整重新解析。
         """
-        styles = {"Error loading styles.csv, check the console": ["",""]}
+        styles, checkpoint = previous
+        digest = checkpoint.matches_prefix(f)
+        if digest is None:
+            return None
+        tail = f.read()
+        try:
+            text = tail.decode(checkpoint.tail_encoding)
+        except (UnicodeDecodeError, LookupError):
+            return None
+        STATS.incr("bytes_read", len(tail))
+        # 复制后再合并，正在使用旧目录的线程不受影响；同名风格以后出现的为准，与完整解析一致
+        appended = StylesCSVLoader.parse_styles_text(text, skip_header=False)
+        if isinstance(styles, CompactStyleCatalog):
+            styles_dict = styles.extended(appended)
+        else:
+            styles_dict = dict(styles)
+            styles_dict.update(appended)
+        STATS.incr("incremental_reloads")
+        return styles_dict, AppendCheckpoint.extend(digest, checkpoint.parsed_bytes, tail, checkpoint.encoding)
+
+    @staticmethod
+    def read_styles_csv_resumable(styles_path: str, encoding_hint=None, previous=None):
+        """与 read_styles_csv 相同，另外返回增量重新加载用的检查点。
+
+        previous 为上次的 (风格字典, 检查点) 时，先尝试只解析文件末尾新增的内容。
+
+        Returns:
+            tuple: (风格字典, 编码, 检查点)。加载失败时编码和检查点为 None
+        """
+        styles = {ERROR_STYLE_NAME: ["",""]}
         if not os.path.exists(styles_path):
-            print(f"""Error. No styles.csv found at path: {styles_path}. Select a valid CSV file.
-                  Your current root directory is: {folder_paths.base_path}
-            """)
-            return styles
+            logger.error("No styles.csv found at path: %s. Select a valid CSV file. "
+                         "Your current root directory is: %s", styles_path, folder_paths.base_path)
+            return styles, None, None
         
         try:
-            # 尝试不同编码方式读取文件
-            encodings = ["utf-8-sig", "utf-8", "gbk", "gb2312", "gb18030", "big5"]
-            loaded = False
-            
-            for encoding in encodings:
-                try:
-                    # 使用csv模块解析，这样可以更好地处理引号和逗号的问题
-                    with open(styles_path, "r", encoding=encoding, newline='') as f:
-                        reader = csv.reader(f)
-                        rows = list(reader)
-                        if len(rows) <= 1:  # 只有标题行或空文件
-                            continue
-                            
-                        # 跳过标题行，处理剩余行
-                        data = rows[1:]
-                        styles_dict = {}
-                        
-                        for row in data:
-                            if len(row) >= 3:  # 确保行至少有3列
-                                style_name = row[0].strip()
-                                positive = row[1].strip()
-                                negative = row[2].strip() if len(row) > 2 else ""
-                                styles_dict[style_name] = [positive, negative]
-                        
-                        # 只有当成功解析至少一个样式时才更新styles
-                        if styles_dict:
-                            styles = styles_dict
-                            loaded = True
-                            print(f"Successfully loaded CSV file using {encoding} encoding. Found {len(styles)} styles.")
-                            break
-                
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    print(f"Error with {encoding} encoding: {e}")
-                    continue
+            with STATS.timed("load_styles_csv"):
+                with open(styles_path, "rb") as f:
+                    if previous is not None:
+                        resumed = StylesCSVLoader.read_styles_tail(f, previous)
+                        if resumed is not None:
+                            logger.debug("Appended rows parsed incrementally from %s", styles_path)
+                            return resumed[0], previous[1].encoding, resumed[1]
+                        f.seek(0)
+                    data = f.read()
+                STATS.incr("bytes_read", len(data))
+                text, encoding = StylesCSVLoader.decode_styles_bytes(data, encoding_hint)
+                styles_dict = StylesCSVLoader.parse_styles_text(text)
+            STATS.incr("rows_parsed", len(styles_dict))
             
-            # 如果所有编码都失败，尝试使用二进制模式读取并强制解码
-            if not loaded:
-                try:
-                    with open(styles_path, 'rb') as f:
-                        content = f.read()
-                        # 尝试检测BOM头
-                        if content.startswith(codecs.BOM_UTF8):
-                            content = content[len(codecs.BOM_UTF8):]
-                            encoding = 'utf-8'
-                        elif content.startswith(codecs.BOM_UTF16_LE):
-                            content = content[len(codecs.BOM_UTF16_LE):]
-                            encoding = 'utf-16-le'
-                        elif content.startswith(codecs.BOM_UTF16_BE):
-                            content = content[len(codecs.BOM_UTF16_BE):]
-                            encoding = 'utf-16-be'
-                        else:
-                            # 没有BOM头，尝试用替换模式解码
-                            encoding = 'utf-8'
-                        
-                        text = content.decode(encoding, errors='replace')
-                        
-                        # 使用字符串处理CSV内容
-                        lines = text.splitlines()
-                        if len(lines) <= 1:  # 只有标题行或空文件
-                            raise Exception("File has no data rows")
-                            
-                        # 解析CSV内容
-                        styles_dict = {}
-                        for line in lines[1:]:  # 跳过标题行
-                            # 处理CSV行，考虑引号内的逗号
-                            parts = re.split(',(?=(?:[^"]*"[^"]*")*[^"]*$)', line)
-                            if len(parts) >= 3:
-                                style_name = parts[0].replace('"', '').strip()
-                                positive = parts[1].replace('"', '').strip()
-                                negative = parts[2].replace('"', '').strip() if len(parts) > 2 else ""
-                                styles_dict[style_name] = [positive, negative]
-                        
-                        if styles_dict:
-                            styles = styles_dict
-                            print(f"Successfully loaded CSV file using binary mode and {encoding} decoding. Found {len(styles)} styles.")
-                            loaded = True
-                
-                except Exception as e:
-                    print(f"Error in binary mode: {e}")
+            # 只有当成功解析至少一个样式时才更新styles
+            if styles_dict:
+                logger.debug("Loaded CSV file %s using %s encoding. Found %d styles.",
+                             styles_path, encoding, len(styles_dict))
+                return styles_dict, encoding, AppendCheckpoint.create(data, encoding)
             
-            # 如果所有尝试都失败
-            if not loaded:
-                print(f"""Error loading CSV file. Failed to decode with all attempted encodings.
-                      Make sure it is a valid CSV file with the required columns.
-                      Your current root directory is: {folder_paths.base_path}
-                """)
+            logger.error("Error loading CSV file %s. No styles found using %s encoding. "
+                         "Make sure it is a valid CSV file with the required columns.", styles_path, encoding)
                 
         except Exception as e:
-            print(f"""Error loading CSV file. 
-                    Your current root directory is: {folder_paths.base_path}
-                    Error: {e}
-            """)
+            logger.error("Error loading CSV file %s. Your current root directory is: %s. Error: %s",
+                         styles_path, folder_paths.base_path, e)
             
-        return styles
+        return styles, None, None
+
+    @staticmethod
+    def load_styles_csv(styles_path: str):
+        """Loads csv file with styles. It has only one column.
+        Ignore the first row (header).
+        positive_prompt are strings separated by comma. Each string is a prompt.
+        negative_prompt are strings separated by comma. Each string is a prompt.
+
+        Returns:
+            list: List of styles. Each style is a dict with keys: style_name and value: [positive_prompt, negative_prompt]
+        """
+        return StylesCSVLoader.read_styles_csv(styles_path)[0]
     
     # 添加CSV文件路径获取函数
     @staticmethod
+    @STATS.timed("find_csv_files")
     def find_csv_files():
         # 获取基本路径
         base_path = folder_paths.base_path
@@ -287,16 +2016,14 @@ class StylesCSVLoader:
         # 添加自定义节点目录下的CSV文件
         custom_nodes_path = os.path.join(base_path, "custom_nodes")
         if os.path.exists(custom_nodes_path):
-            for root, dirs, files in os.walk(custom_nodes_path):
-                for file in files:
-                    if file.endswith('.csv'):
-                        file_path = os.path.join(root, file)
-                        relative_path = os.path.relpath(file_path, base_path)
-                        csv_paths[relative_path] = file_path
+            for file_path in CSV_DISCOVERY_INDEX.scan(custom_nodes_path, base_path):
+                relative_path = os.path.relpath(file_path, base_path)
+                csv_paths[relative_path] = file_path
         
         # 如果没有找到任何CSV文件，添加一个默认选项
         if not csv_paths:
             csv_paths["未找到CSV文件"] = ""
+        CSV_WATCHER.watch(csv_paths)
         
         return csv_paths
         
@@ -304,20 +2031,20 @@ class StylesCSVLoader:
     def INPUT_TYPES(cls):
         # 找到所有可用的CSV文件
         cls.csv_files = cls.find_csv_files()
-        csv_file_names = list(cls.csv_files.keys())
+        csv_file_names = csv_file_choices(cls.csv_files)
         
         # 默认使用第一个CSV文件
         default_csv = csv_file_names[0] if csv_file_names else ""
         cls.current_csv_path = cls.csv_files.get(default_csv, "")
         
-        # 加载样式数据
-        cls.styles_csv = cls.load_styles_csv(cls.current_csv_path)
+        # 从共享缓存加载样式数据
+        styles_csv = resolve_catalog(cls.csv_files, default_csv, cls.current_csv_path)
         
         return {
             "required": {
                 "csv_file": (csv_file_names, {"default": default_csv}),
                 "refresh": ("BOOLEAN", {"default": False, "label_on": "刷新", "label_off": "刷新"}),
-                "styles": (list(cls.styles_csv.keys()),),
+                "styles": (list(styles_csv.keys()),),
             }
         }
     
@@ -326,16 +2053,123 @@ class StylesCSVLoader:
     FUNCTION = "execute"
     CATEGORY = "styles_csv_loader"   
 
+    @classmethod
+    def IS_CHANGED(cls, csv_file, refresh, styles, **kwargs):
+        # 请求刷新时总是重新执行（NaN 与任何值都不相等）
+        if refresh:
+            return float("nan")
+        return catalog_fingerprint(getattr(cls, "csv_files", {}), csv_file,
+                                   getattr(cls, "current_csv_path", ""), [styles])
+
+    @STATS.timed("StylesCSVLoader.execute")
     def execute(self, csv_file, refresh, styles):
-        # 如果选择了新的CSV文件或者请求刷新
-        if csv_file in self.csv_files and (self.current_csv_path != self.csv_files[csv_file] or refresh):
-            self.current_csv_path = self.csv_files[csv_file]
-            self.styles_csv = self.load_styles_csv(self.current_csv_path)
-            # 如果styles不在新加载的styles_csv中，返回空字符串
-            if styles not in self.styles_csv:
-                return ("", "")
+        # 请求刷新时丢弃缓存，强制重新解析
+        if refresh:
+            invalidate_catalog(self.csv_files, csv_file, self.current_csv_path)
+        styles_csv = resolve_catalog(self.csv_files, csv_file, self.current_csv_path)
         
-        return (self.styles_csv[styles][0], self.styles_csv[styles][1])
+        # 如果styles不在加载的styles_csv中，返回空字符串
+        if styles not in styles_csv:
+            return ("", "")
+        
+        return (styles_csv[styles][0], styles_csv[styles][1])
+
+# 带权重的提示词，例如 (masterpiece:1.2)
+_EMPHASIS_RE = re.compile(r"^\((.+):\s*(-?\d+(?:\.\d+)?)\)$", re.S)
+
+
+def split_prompt_terms(prompt):
+    """按顶层逗号拆分提示词，括号内的逗号不拆分，去掉空项"""
+    terms = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(prompt):
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth = max(depth - 1, 0)
+        elif char in ",，" and depth == 0:
+            term = prompt[start:i].strip()
+            if term:
+                terms.append(term)
+            start = i + 1
+    term = prompt[start:].strip()
+    if term:
+        terms.append(term)
+    return terms
+
+
+def tokenize_prompt(prompt):
+    """把提示词拆分为去重用的词条元组列表。
+
+    每个词条为 (原文键, 去权重键, 去权重原文, 权重, 原文)，键均已小写并合并空白。
+    """
+    tokens = []
+    for term in split_prompt_terms(prompt):
+        match = _EMPHASIS_RE.match(term)
+        if match:
+            inner, weight = match.group(1).strip(), float(match.group(2))
+        else:
+            inner, weight = term, 1.0
+        tokens.append((" ".join(term.lower().split()), " ".join(inner.lower().split()), inner, weight, term))
+    return tokens
+
+
+def combine_prompt_terms(token_groups, sep, merge_weights=False):
+    """按首次出现的顺序合并多组词条，去掉重复项。
+
+    token_groups 中每一组对应一个风格，组内用逗号连接，组之间用 sep 连接。
+    merge_weights 为 True 时 (term:1.3) 与 term 视为同一词条，保留最大的权重。
+
+    Returns:
+        tuple: (合并后的文本, 去掉的词条数)
+    """
+    seen = {}
+    groups = []
+    dropped = 0
+    for tokens in token_groups:
+        group = []
+        for raw_key, key, inner, weight, raw in tokens:
+            entry = seen.get(key if merge_weights else raw_key)
+            if entry is not None:
+                dropped += 1
+                if merge_weights and weight > entry[1]:
+                    entry[1] = weight
+                continue
+            entry = [raw, weight, inner]
+            seen[key if merge_weights else raw_key] = entry
+            group.append(entry)
+        if group:
+            groups.append(group)
+
+    def render(entry):
+        if not merge_weights:
+            return entry[0]
+        return entry[2] if entry[1] == 1.0 else f"({entry[2]}:{entry[1]:g})"
+
+    return sep.join(", ".join(render(entry) for entry in group) for group in groups), dropped
+
+
+def join_prompt_parts(*parts):
+    """依次拼接提示词片段，前一段不以空格、换行或逗号结尾时补一个空格"""
+    combined = ""
+    for part in parts:
+        if part:
+            if combined and combined[-1] not in [" ", "\n", ",", "，"]:
+                combined += " "
+            combined += part
+    return combined
+
+
+def style_tokens_for(styles_csv, style):
+    """返回风格 (正向词条, 负向词条)，分词结果缓存在目录条目上"""
+    style_tokens = STYLE_CATALOG_CACHE.derived(styles_csv, "tokens", dict)
+    tokens = style_tokens.get(style)
+    if tokens is None:
+        pos, neg = styles_csv[style]
+        tokens = style_tokens[style] = (tokenize_prompt(pos), tokenize_prompt(neg))
+    return tokens
+
 
 class MultiStylesCSVLoader:
     """
@@ -346,15 +2180,14 @@ class MultiStylesCSVLoader:
     def INPUT_TYPES(cls):
         # 找到所有可用的CSV文件
         cls.csv_files = StylesCSVLoader.find_csv_files()
-        csv_file_names = list(cls.csv_files.keys())
+        csv_file_names = csv_file_choices(cls.csv_files)
         
         # 默认使用第一个CSV文件
         default_csv = csv_file_names[0] if csv_file_names else ""
         cls.current_csv_path = cls.csv_files.get(default_csv, "")
         
-        # 加载样式数据
-        cls.styles_csv = StylesCSVLoader.load_styles_csv(cls.current_csv_path)
-        styles_list = list(cls.styles_csv.keys())
+        # 从共享缓存加载样式数据
+        styles_list = list(resolve_catalog(cls.csv_files, default_csv, cls.current_csv_path).keys())
         
         # 添加"无"选项到风格列表
         styles_list_with_none = ["无"] + styles_list
@@ -376,6 +2209,7 @@ class MultiStylesCSVLoader:
                 "negative_prefix": ("STRING", {"default": "", "multiline": True}),
                 "negative_suffix": ("STRING", {"default": "", "multiline": True}),
                 "separator": (["逗号", "空格", "换行"], {"default": "逗号"}),
+                "combine_mode": (["拼接", "去重", "去重并合并权重"], {"default": "拼接"}),
             }
         }
     
@@ -384,23 +2218,33 @@ class MultiStylesCSVLoader:
     FUNCTION = "execute"
     CATEGORY = "styles_csv_loader"   
 
+    @classmethod
+    def IS_CHANGED(cls, csv_file, refresh, style1, style2="无", style3="无", style4="无", style5="无", **kwargs):
+        # 请求刷新时总是重新执行（NaN 与任何值都不相等）
+        if refresh:
+            return float("nan")
+        selected = [style for style in (style1, style2, style3, style4, style5) if style != "无"]
+        return catalog_fingerprint(getattr(cls, "csv_files", {}), csv_file,
+                                   getattr(cls, "current_csv_path", ""), selected)
+
+    @STATS.timed("MultiStylesCSVLoader.execute")
     def execute(self, csv_file, refresh, style1, style2="无", style3="无", style4="无", style5="无", 
                positive_prefix="", positive_suffix="", negative_prefix="", negative_suffix="", 
-               separator="逗号", 中文翻译=True):
-        # 如果选择了新的CSV文件或者请求刷新
-        if csv_file in self.csv_files and (self.current_csv_path != self.csv_files[csv_file] or refresh):
-            self.current_csv_path = self.csv_files[csv_file]
-            self.styles_csv = StylesCSVLoader.load_styles_csv(self.current_csv_path)
+               separator="逗号", 中文翻译=True, combine_mode="拼接"):
+        # 请求刷新时丢弃缓存，强制重新解析
+        if refresh:
+            invalidate_catalog(self.csv_files, csv_file, self.current_csv_path)
+        styles_csv = resolve_catalog(self.csv_files, csv_file, self.current_csv_path)
         
         # 收集所有选择的有效风格
         selected_styles = [style1]
-        if style2 != "无" and style2 in self.styles_csv:
+        if style2 != "无" and style2 in styles_csv:
             selected_styles.append(style2)
-        if style3 != "无" and style3 in self.styles_csv:
+        if style3 != "无" and style3 in styles_csv:
             selected_styles.append(style3)
-        if style4 != "无" and style4 in self.styles_csv:
+        if style4 != "无" and style4 in styles_csv:
             selected_styles.append(style4)
-        if style5 != "无" and style5 in self.styles_csv:
+        if style5 != "无" and style5 in styles_csv:
             selected_styles.append(style5)
         
         # 获取所有正向和负向提示词
@@ -408,8 +2252,8 @@ class MultiStylesCSVLoader:
         negative_prompts = []
         
         for style in selected_styles:
-            if style in self.styles_csv:
-                pos, neg = self.styles_csv[style]
+            if style in styles_csv:
+                pos, neg = styles_csv[style]
                 
                 if pos and pos.strip():
                     pos = pos.strip()
@@ -424,41 +2268,230 @@ class MultiStylesCSVLoader:
         elif separator == "换行":
             sep = "\n"
         
-        # 如果启用了自动翻译，则对中文文本进行翻译
+        # 如果启用了自动翻译，则对中文文本进行翻译；四个字段作为一批并发翻译，总耗时有上限
         if 中文翻译:
-            if positive_prefix:
-                positive_prefix = translate_chinese_to_english(positive_prefix)
-            if positive_suffix:
-                positive_suffix = translate_chinese_to_english(positive_suffix)
-            if negative_prefix:
-                negative_prefix = translate_chinese_to_english(negative_prefix)
-            if negative_suffix:
-                negative_suffix = translate_chinese_to_english(negative_suffix)
+            positive_prefix, positive_suffix, negative_prefix, negative_suffix = translate_batch(
+                [positive_prefix, positive_suffix, negative_prefix, negative_suffix]
+            )
+        
+        # 合并风格提示词
+        if combine_mode == "拼接":
+            positive_body = sep.join(positive_prompts)
+            negative_body = sep.join(negative_prompts)
+        else:
+            # 每个风格的分词结果缓存在目录条目上，合并只需遍历一次所有词条
+            positive_groups = []
+            negative_groups = []
+            for style in selected_styles:
+                if style not in styles_csv:
+                    continue
+                tokens = style_tokens_for(styles_csv, style)
+                positive_groups.append(tokens[0])
+                negative_groups.append(tokens[1])
+            merge_weights = combine_mode == "去重并合并权重"
+            positive_body, positive_dropped = combine_prompt_terms(positive_groups, sep, merge_weights)
+            negative_body, negative_dropped = combine_prompt_terms(negative_groups, sep, merge_weights)
+            # 每次执行都报告去重结果，方便用户确认合并模式的效果
+            if positive_dropped or negative_dropped:
+                logger.info("合并风格时去掉了 %d 个重复的正向词条和 %d 个重复的负向词条",
+                            positive_dropped, negative_dropped)
+            STATS.incr("dedup_terms_dropped", positive_dropped + negative_dropped)
         
         # 合并提示词
-        combined_positive = positive_prefix
-        if positive_prompts:
-            if combined_positive and combined_positive[-1] not in [" ", "\n", ",", "，"]:
-                combined_positive += " "
-            combined_positive += sep.join(positive_prompts)
-        if positive_suffix:
-            if combined_positive and combined_positive[-1] not in [" ", "\n", ",", "，"]:
-                combined_positive += " "
-            combined_positive += positive_suffix
-        
-        combined_negative = negative_prefix
-        if negative_prompts:
-            if combined_negative and combined_negative[-1] not in [" ", "\n", ",", "，"]:
-                combined_negative += " "
-            combined_negative += sep.join(negative_prompts)
-        if negative_suffix:
-            if combined_negative and combined_negative[-1] not in [" ", "\n", ",", "，"]:
-                combined_negative += " "
-            combined_negative += negative_suffix
+        combined_positive = join_prompt_parts(positive_prefix, positive_body, positive_suffix)
+        combined_negative = join_prompt_parts(negative_prefix, negative_body, negative_suffix)
         
         return (combined_positive, combined_negative)
 
+class BatchStylesCSVLoader:
+    """
+    批量生成提示词：按选择条件一次取出多个风格，与基础提示词合并后以列表输出，
+    一次排队即可遍历整个风格库。
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        # 找到所有可用的CSV文件
+        cls.csv_files = StylesCSVLoader.find_csv_files()
+        csv_file_names = csv_file_choices(cls.csv_files)
+        
+        # 默认使用第一个CSV文件
+        default_csv = csv_file_names[0] if csv_file_names else ""
+        cls.current_csv_path = cls.csv_files.get(default_csv, "")
+        
+        return {
+            "required": {
+                "csv_file": (csv_file_names, {"default": default_csv}),
+                "refresh": ("BOOLEAN", {"default": False, "label_on": "刷新", "label_off": "刷新"}),
+                "selection_mode": (["全部", "分类前缀", "正则表达式", "名称列表"], {"default": "全部"}),
+                "selection": ("STRING", {"default": "", "multiline": True}),
+                "base_positive": ("STRING", {"default": "", "multiline": True}),
+                "base_negative": ("STRING", {"default": "", "multiline": True}),
+            },
+            "optional": {
+                "中文翻译": ("BOOLEAN", {"default": True, "label_on": "中文自动翻译为英文", "label_off": "保持原文"}),
+                "combine_mode": (["拼接", "去重", "去重并合并权重"], {"default": "拼接"}),
+                "limit": ("INT", {"default": 0, "min": 0, "max": 100000}),
+            }
+        }
+    
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("style names", "positive prompts", "negative prompts")
+    OUTPUT_IS_LIST = (True, True, True)
+    FUNCTION = "execute"
+    CATEGORY = "styles_csv_loader"
+    
+    @staticmethod
+    def select_styles(styles_csv, selection_mode, selection):
+        """按选择条件返回风格名列表，保持CSV中的顺序（名称列表模式保持输入顺序）"""
+        if selection_mode == "分类前缀":
+            prefix = selection.strip()
+            return [name for name in styles_csv.keys() if name.startswith(prefix)]
+        if selection_mode == "正则表达式":
+            try:
+                pattern = re.compile(selection.strip())
+            except re.error as e:
+                raise ValueError(f"无效的正则表达式 {selection.strip()!r}: {e}")
+            return [name for name in styles_csv.keys() if pattern.search(name)]
+        if selection_mode == "名称列表":
+            names = []
+            missing = []
+            for line in selection.splitlines():
+                name = line.strip()
+                if not name:
+                    continue
+                (names if name in styles_csv else missing).append(name)
+            if missing:
+                logger.warning("以下风格不在CSV文件中，已跳过: %s", ", ".join(missing))
+            return names
+        return list(styles_csv.keys())
+    
+    @staticmethod
+    def apply_style(base, style_prompt, base_tokens, style_tokens, merge_mode):
+        """把基础提示词与风格提示词合并。
+        风格中包含 {prompt} 占位符时（A1111 的约定）用基础提示词替换占位符，否则基础提示词在前。
+        """
+        if "{prompt}" in style_prompt:
+            combined = style_prompt.replace("{prompt}", base)
+            if merge_mode is None:
+                return combined
+            return combine_prompt_terms([tokenize_prompt(combined)], ", ", merge_mode)[0]
+        if merge_mode is None:
+            return join_prompt_parts(base, style_prompt)
+        return combine_prompt_terms([base_tokens, style_tokens], ", ", merge_mode)[0]
+    
+    @classmethod
+    def IS_CHANGED(cls, csv_file, refresh, **kwargs):
+        # 批量节点可能选中整个目录，只比较文件的 mtime 和大小
+        if refresh:
+            return float("nan")
+        return catalog_fingerprint(getattr(cls, "csv_files", {}), csv_file, getattr(cls, "current_csv_path", ""))
+
+    @STATS.timed("BatchStylesCSVLoader.execute")
+    def execute(self, csv_file, refresh, selection_mode, selection, base_positive, base_negative,
+                中文翻译=True, combine_mode="拼接", limit=0):
+        # 请求刷新时丢弃缓存，强制重新解析
+        if refresh:
+            invalidate_catalog(self.csv_files, csv_file, self.current_csv_path)
+        styles_csv = resolve_catalog(self.csv_files, csv_file, self.current_csv_path)
+        
+        names = self.select_styles(styles_csv, selection_mode, selection)
+        if not names:
+            # 与无效的正则表达式一样直接报错，避免下游节点收到空列表后静默跳过
+            raise ValueError(f"选择方式 {selection_mode!r} 没有匹配到任何风格: {selection.strip()!r}")
+        if limit:
+            names = names[:limit]
+        
+        # 基础提示词只翻译一次
+        if 中文翻译:
+            base_positive, base_negative = translate_batch([base_positive, base_negative])
+        
+        merge_mode = None if combine_mode == "拼接" else combine_mode == "去重并合并权重"
+        base_positive_tokens = tokenize_prompt(base_positive) if merge_mode is not None else None
+        base_negative_tokens = tokenize_prompt(base_negative) if merge_mode is not None else None
+        
+        positives = []
+        negatives = []
+        for name in names:
+            pos, neg = styles_csv[name]
+            tokens = style_tokens_for(styles_csv, name) if merge_mode is not None else (None, None)
+            positives.append(self.apply_style(base_positive, pos, base_positive_tokens, tokens[0], merge_mode))
+            negatives.append(self.apply_style(base_negative, neg, base_negative_tokens, tokens[1], merge_mode))
+        
+        logger.debug("BatchStylesCSVLoader 生成了 %d 组提示词", len(names))
+        return (names, positives, negatives)
+
 # 文本预览节点，通过JS扩展在节点上显示文本
+class PreviewTextStore:
+    """
+    保存超过预览上限的完整文本，前端按页通过 /styles_csv_loader/preview/{hash} 读取。
+    按最近使用顺序淘汰，限制条目数和总字符数。
+    """
+
+    def __init__(self, max_entries=32, max_chars=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._texts = OrderedDict()  # 哈希 -> 文本
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def put(self, text):
+        key = self.digest(text)
+        with self._lock:
+            if key in self._texts:
+                self._texts.move_to_end(key)
+                return key
+            self._texts[key] = text
+            self._total_chars += len(text)
+            while len(self._texts) > 1 and (
+                len(self._texts) > self.max_entries or self._total_chars > self.max_chars
+            ):
+                _, evicted = self._texts.popitem(last=False)
+                self._total_chars -= len(evicted)
+        return key
+
+    def page(self, key, page, page_size):
+        """返回第 page 页（从1开始）的文本和总页数，文本已被淘汰时返回 None"""
+        with self._lock:
+            text = self._texts.get(key)
+            if text is None:
+                return None
+            self._texts.move_to_end(key)
+        pages = max((len(text) + page_size - 1) // page_size, 1)
+        start = (page - 1) * page_size
+        return {
+            "hash": key,
+            "length": len(text),
+            "page": page,
+            "page_size": page_size,
+            "pages": pages,
+            "text": text[start:start + page_size],
+        }
+
+
+def _env_int(name, default, minimum):
+    """读取整数环境变量，无效时使用默认值，并限制最小值"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return max(int(value), minimum)
+    except ValueError:
+        logger.warning("Invalid value for %s: %r, using %d", name, value, default)
+        return default
+
+
+# 预览文本的字符数上限，超过时只发送开头和结尾，完整文本按页读取；至少为2，保证开头和结尾各有内容
+PREVIEW_MAX_CHARS = _env_int("STYLES_CSV_PREVIEW_MAX_CHARS", 16 * 1024, 2)
+# 按页读取完整文本时每页的字符数
+PREVIEW_PAGE_SIZE = _env_int("STYLES_CSV_PREVIEW_PAGE_SIZE", 8 * 1024, 1)
+PREVIEW_TEXT_STORE = PreviewTextStore()
+
+
 class PreviewTextNode:
     @classmethod
     def INPUT_TYPES(s):
@@ -475,21 +2508,233 @@ class PreviewTextNode:
     DESCRIPTION = "文本预览节点"
 
     def preview_text(self, text):
-        """显示输入的文本在节点上"""
-        # 打印用于调试
-        print(f"PreviewTextNode 文本: {text[:50]}...")
+        """显示输入的文本在节点上，超过 PREVIEW_MAX_CHARS 时只发送摘要"""
+        logger.debug("PreviewTextNode 文本 (%d 字符): %s...", len(text), text[:50])
         
-        # 返回标准格式，确保文本不会被拆分成字符
+        if len(text) <= PREVIEW_MAX_CHARS:
+            # 返回标准格式，确保文本不会被拆分成字符
+            return {
+                "ui": {
+                    "string": text  # 直接传递文本字符串，不要放入数组
+                },
+                "result": (text,)
+            }
+
+        # 文本过大：只发送开头、结尾和哈希，完整内容由前端按页请求
+        key = PREVIEW_TEXT_STORE.put(text)
+        edge = PREVIEW_MAX_CHARS // 2
+        head, tail = text[:edge], text[len(text) - edge:]
+        omitted = len(text) - len(head) - len(tail)
+        STATS.incr("preview_truncated")
         return {
             "ui": {
-                "string": text  # 直接传递文本字符串，不要放入数组
+                "string": f"{head}\n\n... 省略 {omitted} 个字符 ...\n\n{tail}",
+                # 摘要已在 string 中，这里只放读取完整文本所需的信息
+                "preview": [{
+                    "hash": key,
+                    "length": len(text),
+                    "omitted": omitted,
+                    "page_size": PREVIEW_PAGE_SIZE,
+                    "pages": (len(text) + PREVIEW_PAGE_SIZE - 1) // PREVIEW_PAGE_SIZE,
+                }],
             },
             "result": (text,)
         }
         
+class StyleNameIndex:
+    """
+    风格名称的搜索索引，每个目录只构建一次（缓存在目录条目上）。
+    支持前缀、子串和模糊（按顺序包含所有字符）搜索，以及按 "分类 | 名称" 约定分组。
+    """
+
+    CATEGORY_SEPARATOR = " | "
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.lowered = [name.lower() for name in self.names]
+        self.categories = [self.category_of(name) for name in self.names]
+        # 前缀搜索用二分查找
+        self._sorted = sorted(range(len(self.names)), key=self.lowered.__getitem__)
+        self._sorted_keys = [self.lowered[i] for i in self._sorted]
+        # 子串搜索在拼接后的大字符串上用 str.find 完成
+        self._joined = "\n".join(self.lowered)
+        self._line_starts = []
+        position = 0
+        for name in self.lowered:
+            self._line_starts.append(position)
+            position += len(name) + 1
+        self.category_counts = {}
+        for category in self.categories:
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+
+    @classmethod
+    def category_of(cls, name):
+        if cls.CATEGORY_SEPARATOR in name:
+            return name.split(cls.CATEGORY_SEPARATOR, 1)[0].strip()
+        return ""
+
+    def _prefix(self, query):
+        start = bisect.bisect_left(self._sorted_keys, query)
+        end = bisect.bisect_left(self._sorted_keys, query + "\uffff")
+        return sorted(self._sorted[start:end])
+
+    def _substring(self, query):
+        matches = []
+        position = self._joined.find(query)
+        while position != -1:
+            i = bisect.bisect_right(self._line_starts, position) - 1
+            matches.append(i)
+            # 从下一行开始继续查找，同一名称只记录一次
+            next_start = self._line_starts[i + 1] if i + 1 < len(self._line_starts) else len(self._joined)
+            position = self._joined.find(query, next_start)
+        return matches
+
+    def _fuzzy(self, query):
+        scored = []
+        for i, name in enumerate(self.lowered):
+            # 所有字符按顺序出现即为匹配，跨度越小、起始越靠前得分越高
+            position = name.find(query[0])
+            if position == -1:
+                continue
+            first = last = position
+            for char in query[1:]:
+                position = name.find(char, last + 1)
+                if position == -1:
+                    break
+                last = position
+            else:
+                scored.append(((last - first) - len(query), first, i))
+        scored.sort()
+        return [i for _, _, i in scored]
+
+    def search(self, query="", mode="substring", category=None):
+        """返回匹配的名称下标列表"""
+        query = query.strip().lower()
+        if not query:
+            matches = range(len(self.names))
+        elif mode == "prefix":
+            matches = self._prefix(query)
+        elif mode == "fuzzy":
+            matches = self._fuzzy(query)
+        else:
+            matches = self._substring(query)
+        if category is not None:
+            matches = [i for i in matches if self.categories[i] == category]
+        return matches
+
+
+def _style_search_request(csv_file, query, mode, category, page, page_size, group, if_none_match=None):
+    """在线程中执行的搜索，避免解析大文件时阻塞事件循环。
+
+    Returns:
+        tuple: (HTTP状态码, 结果, ETag)
+    """
+    csv_files = StylesCSVLoader.find_csv_files()
+    if csv_file == MERGED_CATALOG_KEY:
+        csv_path = ""
+        fingerprint = catalog_fingerprint(csv_files, csv_file)
+    else:
+        csv_path = csv_files.get(csv_file) if csv_file else next(iter(csv_files.values()), "")
+        fingerprint = STYLE_CATALOG_CACHE.fingerprint(csv_path) if csv_path else None
+    if fingerprint is None:
+        return 404, {"error": "CSV file not found"}, None
+    # ETag 只取决于文件指纹和查询参数，命中时无需加载目录
+    etag = '"%s"' % hashlib.sha1(
+        repr((fingerprint, query, mode, category, page, page_size, group)).encode("utf-8")
+    ).hexdigest()
+    if if_none_match == etag:
+        return 304, None, etag
+    styles = resolve_catalog(csv_files, csv_file, csv_path)
+    index = STYLE_CATALOG_CACHE.derived(styles, "name_index", lambda: StyleNameIndex(styles.keys()))
+    matches = index.search(query, mode, category)
+    start = (page - 1) * page_size
+    result = {
+        "csv_file": csv_file,
+        "query": query,
+        "mode": mode,
+        "total": len(matches),
+        "page": page,
+        "page_size": page_size,
+        "items": [
+            {"name": index.names[i], "category": index.categories[i]}
+            for i in matches[start:start + page_size]
+        ],
+    }
+    if group:
+        result["categories"] = [
+            {"category": name, "count": count} for name, count in index.category_counts.items()
+        ]
+    return 200, result, etag
+
+
+@PromptServer.instance.routes.get("/styles_csv_loader/stats")
+async def loader_stats(request):
+    """各阶段耗时直方图、计数器以及缓存状态"""
+    stats = STATS.snapshot()
+    stats["catalog_cache"] = STYLE_CATALOG_CACHE.stats()
+    stats["last_scan"] = CSV_DISCOVERY_INDEX.last_scan_stats
+    return web.json_response(stats)
+
+
+@PromptServer.instance.routes.get("/styles_csv_loader/files")
+async def list_style_files(request):
+    loop = asyncio.get_running_loop()
+    csv_files = await loop.run_in_executor(None, StylesCSVLoader.find_csv_files)
+    return web.json_response({"files": csv_file_choices(csv_files)})
+
+
+@PromptServer.instance.routes.get("/styles_csv_loader/styles")
+async def search_styles(request):
+    """分页搜索风格名称。
+
+    参数: csv_file, q, mode (prefix/substring/fuzzy), category, page, page_size, group
+    """
+    query = request.query
+    try:
+        page = max(int(query.get("page", 1)), 1)
+        page_size = min(max(int(query.get("page_size", 50)), 1), 500)
+    except ValueError:
+        return web.json_response({"error": "page and page_size must be integers"}, status=400)
+    mode = query.get("mode", "substring")
+    if mode not in ("prefix", "substring", "fuzzy"):
+        return web.json_response({"error": f"unknown mode: {mode}"}, status=400)
+    category = query.get("category")
+    group = query.get("group", "0") in ("1", "true")
+
+    loop = asyncio.get_running_loop()
+    status, result, etag = await loop.run_in_executor(
+        None, _style_search_request, query.get("csv_file", ""), query.get("q", ""), mode, category,
+        page, page_size, group, request.headers.get("If-None-Match"),
+    )
+    if etag is None:
+        return web.json_response(result, status=status)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if status == 304:
+        return web.Response(status=304, headers=headers)
+    return web.json_response(result, headers=headers)
+
+
+@PromptServer.instance.routes.get("/styles_csv_loader/preview/{hash}")
+async def preview_text_page(request):
+    """按页读取 PreviewTextNode 中被截断的完整文本。
+
+    参数: page, page_size（字符数）
+    """
+    try:
+        page = max(int(request.query.get("page", 1)), 1)
+        page_size = min(max(int(request.query.get("page_size", PREVIEW_PAGE_SIZE)), 1), 64 * 1024)
+    except ValueError:
+        return web.json_response({"error": "page and page_size must be integers"}, status=400)
+    result = PREVIEW_TEXT_STORE.page(request.match_info["hash"], page, page_size)
+    if result is None:
+        return web.json_response({"error": "preview text expired, run the node again"}, status=404)
+    return web.json_response(result)
+
+
 NODE_CLASS_MAPPINGS = {
     "Load Styles CSV": StylesCSVLoader,
     "Multi Styles CSV": MultiStylesCSVLoader,
+    "Batch Styles CSV": BatchStylesCSVLoader,
     "Preview Text": PreviewTextNode
 }
 # 节点显示名称已移至__init__.py文件中
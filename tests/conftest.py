@@ -0,0 +1,24 @@
+"""测试共用的夹具，ComfyUI 模块由基准测试中的桩模块代替"""
+import importlib.util
+import os
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_bench():
+    spec = importlib.util.spec_from_file_location(
+        "bench_loader", os.path.join(REPO_DIR, "benchmarks", "bench_loader.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def loader():
+    bench = _load_bench()
+    bench.install_stubs(tempfile.mkdtemp(prefix="styles_csv_test_"))
+    return bench.import_loader()
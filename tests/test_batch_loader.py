@@ -0,0 +1,38 @@
+"""批量加载节点的测试"""
+import pytest
+
+
+@pytest.fixture
+def node(loader, tmp_path):
+    path = tmp_path / "styles.csv"
+    path.write_text("name,prompt,negative_prompt\n人物-少女,girl,bad\n人物-老人,old man,bad\n风景-山,mountain,blurry\n",
+                    encoding="utf-8")
+    node = loader.BatchStylesCSVLoader()
+    node.csv_files = {"styles.csv": str(path)}
+    node.current_csv_path = str(path)
+    return node
+
+
+def _execute(node, mode, selection):
+    return node.execute("styles.csv", False, mode, selection, "", "", 中文翻译=False)
+
+
+def test_prefix_selection(node):
+    names, positives, _ = _execute(node, "分类前缀", "人物-")
+    assert names == ["人物-少女", "人物-老人"]
+    assert positives == ["girl", "old man"]
+
+
+@pytest.mark.parametrize("mode, selection", [
+    ("分类前缀", "动物-"),
+    ("正则表达式", "^不存在$"),
+    ("名称列表", "不存在\n"),
+])
+def test_empty_selection_raises(node, mode, selection):
+    with pytest.raises(ValueError, match=mode):
+        _execute(node, mode, selection)
+
+
+def test_invalid_regex_raises(node):
+    with pytest.raises(ValueError, match="无效的正则表达式"):
+        _execute(node, "正则表达式", "(")
@@ -0,0 +1,59 @@
+"""增量重新加载的回归测试"""
+import pytest
+
+
+def _append_and_reload(loader, path, initial, appended):
+    with open(path, "wb") as f:
+        f.write(initial)
+    cache = loader.StyleCatalogCache()
+    cache.get(path)
+    with open(path, "ab") as f:
+        f.write(appended)
+    return dict(cache.get(path).items())
+
+
+@pytest.mark.parametrize("initial, appended", [
+    # 只用 \r 换行的文件
+    (b"name,prompt,neg\ra,1,2\rb,3,4\r", b"c,5,6\r"),
+    (b"name,prompt,neg\r\na,1,2\r\n", b"b,3,4\r\n"),
+    (b"name,prompt,neg\na,\"multi\nline\",2\n", b"b,3,4\n"),
+    # 只有标题行的文件
+    (b"name,prompt,neg\n", b"a,1,2\n"),
+    (b"name,prompt,neg", b"\na,1,2\n"),
+])
+def test_incremental_reload_matches_full_parse(loader, tmp_path, initial, appended):
+    path = str(tmp_path / "styles.csv")
+    styles = _append_and_reload(loader, path, initial, appended)
+    full, _ = loader.StylesCSVLoader.read_styles_csv(path)
+    assert styles == full
+    assert "name" not in styles
+
+
+def test_checkpoint_requires_complete_header(loader):
+    assert loader.AppendCheckpoint.create(b"name,prompt,neg", "utf-8") is None
+    assert loader.AppendCheckpoint.create(b"name,prompt,neg\ra,1,2\r", "utf-8").parsed_bytes == 22
+
+
+def _rewrite_and_reload(loader, path, initial, rewritten):
+    with open(path, "wb") as f:
+        f.write(initial)
+    cache = loader.StyleCatalogCache()
+    cache.get(path)
+    with open(path, "wb") as f:
+        f.write(rewritten)
+    return dict(cache.get(path).items())
+
+
+@pytest.mark.parametrize("initial, rewritten", [
+    # 最后一行没有换行符，之后被改名
+    (b"name,prompt,neg\nkeep,1,2\nold,3,4", b"name,prompt,neg\nkeep,1,2\nrenamed,3,4\n"),
+    # 多余的引号让行边界停在中间，后面的行被改名
+    (b'name,prompt,neg\nodd,5in" wide,n\nkeep,1,2\nold,3,4\n',
+     b'name,prompt,neg\nodd,5in" wide,n\nkeep,1,2\nrenamed,3,4\n'),
+])
+def test_rows_after_checkpoint_are_not_kept(loader, tmp_path, initial, rewritten):
+    path = str(tmp_path / "styles.csv")
+    styles = _rewrite_and_reload(loader, path, initial, rewritten)
+    full, _ = loader.StylesCSVLoader.read_styles_csv(path)
+    assert styles == full
+    assert "old" not in styles
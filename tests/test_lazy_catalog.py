@@ -0,0 +1,19 @@
+"""延迟加载目录的回归测试"""
+
+
+def test_non_ascii_after_sample_is_decoded_strictly(loader, tmp_path):
+    # 前 64KB 都是 ASCII，GB18030 字节只出现在文件末尾的提示词里（名称仍是 ASCII）
+    rows = ["name,prompt,negative_prompt"]
+    rows += ["style%05d,prompt %05d,negative" % (i, i) for i in range(3000)]
+    rows.append("cn_style,含𠀀字的提示词,负面")
+    data = "\n".join(rows).encode("gb18030") + b"\n"
+    assert data[:65536].isascii()
+    path = str(tmp_path / "styles.csv")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    catalog, encoding = loader.LazyStyleCatalog.load(path)
+    full, _ = loader.StylesCSVLoader.read_styles_csv(path)
+    assert encoding == "gb18030"
+    assert catalog["cn_style"] == full["cn_style"]
+    assert catalog["cn_style"][0] == "含𠀀字的提示词"
@@ -0,0 +1,58 @@
+"""容错CSV解析器的测试：格式正确时与 csv 模块结果一致，格式错误时报告行号"""
+import csv
+import io
+import logging
+
+import pytest
+
+WELL_FORMED = [
+    'a,"b, with comma",c\n',
+    'a,"say ""hi""",c\n',
+    'a,"multi\nline\r\nfield",c\nnext,1,2\n',
+    'a,1,2\r\nb,3,4\rc,5,6\nd,7,8',
+    'a,"",c\n\nb,,\n',
+    'a,"x\r\ny",c\rb,"""",2\r\n',
+]
+
+
+@pytest.mark.parametrize("text", WELL_FORMED)
+def test_matches_csv_reader_on_well_formed_input(loader, text):
+    expected = list(csv.reader(io.StringIO(text, newline="")))
+    rows = list(loader.StylesCSVLoader.iter_lenient_rows(text))
+    assert [row for _, row, _ in rows] == expected
+    assert all(problem is None for _, _, problem in rows)
+
+
+def test_line_numbers_count_every_newline_style(loader):
+    text = 'a,"one\ntwo",c\r\nb,1,2\rc,3,4\n'
+    assert [line for line, _, _ in loader.StylesCSVLoader.iter_lenient_rows(text)] == [1, 3, 4]
+
+
+def _parse_with_warnings(loader, caplog, text):
+    with caplog.at_level(logging.WARNING, logger=loader.logger.name):
+        styles = loader.StylesCSVLoader.parse_styles_text(text)
+    return styles, caplog.text
+
+
+def test_stray_quote_is_reported(loader):
+    text = 'name,prompt,negative\nok,1,2\nodd,5in" wide,n\nlast,3,4\n'
+    rows = list(loader.StylesCSVLoader.iter_lenient_rows(text))
+    assert [(line, problem) for line, _, problem in rows if problem] == [(3, "stray quote")]
+    assert rows[2][1] == ["odd", '5in" wide', "n"]
+
+
+def test_unclosed_quote_is_reported_without_swallowing_rows(loader):
+    text = 'name,prompt,negative\nbad,"open,n\nnext,1,2\n'
+    rows = list(loader.StylesCSVLoader.iter_lenient_rows(text))
+    assert [(line, problem) for line, _, problem in rows if problem] == [(2, "unbalanced quote")]
+    assert rows[2] == (3, ["next", "1", "2"], None)
+
+
+def test_oversized_field_falls_back_to_lenient_parsing(loader, caplog):
+    big = "x" * (csv.field_size_limit() + 1)
+    text = f'name,prompt,negative\nbig,{big},n\nodd,5in" wide,n\nsmall,1,2\n'
+    styles, log = _parse_with_warnings(loader, caplog, text)
+    assert "falling back to lenient parsing" in log
+    assert "line 3: stray quote" in log
+    assert styles["big"] == [big, "n"]
+    assert styles["small"] == ["1", "2"]
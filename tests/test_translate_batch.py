@@ -0,0 +1,87 @@
+"""批量翻译的截止时间、离线兜底和熔断器测试"""
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def backend(loader, monkeypatch):
+    """注册一个可控的测试后端，返回设置其行为的函数"""
+    monkeypatch.setattr(loader, "TRANSLATION_CACHE", loader.TranslationCache(path=":memory:"))
+    monkeypatch.setattr(loader, "TRANSLATION_BREAKER", loader.CircuitBreaker())
+    monkeypatch.setattr(loader, "TRANSLATION_BACKEND", "test")
+    release = threading.Event()
+    calls = []
+    behavior = {"delay": 0.0, "error": None}
+
+    def translate(text):
+        calls.append(text)
+        if behavior["delay"]:
+            release.wait(behavior["delay"])
+        if behavior["error"] is not None:
+            raise behavior["error"]
+        return f"<{text}>"
+
+    monkeypatch.setitem(loader.TRANSLATION_BACKENDS, "test", translate)
+    behavior["calls"] = calls
+    yield behavior
+    # 让仍在线程池中等待的慢请求尽快结束
+    release.set()
+
+
+def test_deadline_caps_slow_backend(loader, backend):
+    backend["delay"] = 3.0
+    start = time.monotonic()
+    results = loader.translate_batch(["少女", "微笑"], timeout=0.5)
+    elapsed = time.monotonic() - start
+    assert elapsed < 1.5
+    # 超时的文本改用离线词典翻译
+    assert results == [loader._dictionary_backend("少女"), loader._dictionary_backend("微笑")]
+
+
+def test_backend_error_falls_back_to_offline(loader, backend):
+    backend["error"] = RuntimeError("network down")
+    assert loader.translate_chinese_to_english("少女") == loader._dictionary_backend("少女")
+    assert loader.TRANSLATION_CACHE.get("test", "少女") is None
+
+
+def test_breaker_opens_after_three_failures(loader, backend):
+    backend["error"] = RuntimeError("network down")
+    for text in ("一", "二", "三"):
+        loader.translate_chinese_to_english(text)
+    assert loader.TRANSLATION_BREAKER.is_open
+    # 熔断期间不再调用后端
+    loader.translate_chinese_to_english("四")
+    assert backend["calls"] == ["一", "二", "三"]
+
+
+def test_half_open_probe(loader):
+    breaker = loader.CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    # 冷却之后只放行一次试探
+    assert breaker.allow()
+    assert not breaker.allow()
+    # 试探失败继续保持打开
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_late_result_lands_in_cache(loader, backend):
+    backend["delay"] = 0.3
+    assert loader.translate_chinese_to_english("少女", timeout=0.05) == loader._dictionary_backend("少女")
+    deadline = time.monotonic() + 2.0
+    while loader.TRANSLATION_CACHE.get("test", "少女") is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert loader.TRANSLATION_CACHE.get("test", "少女") == "<少女>"
+    # 下一次直接命中缓存，不再调用后端
+    assert loader.translate_chinese_to_english("少女") == "<少女>"
+    assert backend["calls"] == ["少女"]
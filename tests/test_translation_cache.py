@@ -0,0 +1,54 @@
+"""翻译缓存的测试，使用内存中的 SQLite 数据库"""
+import itertools
+
+import pytest
+
+
+@pytest.fixture
+def cache(loader, monkeypatch):
+    cache = loader.TranslationCache(path=":memory:")
+    monkeypatch.setattr(loader, "TRANSLATION_CACHE", cache)
+    monkeypatch.setattr(loader, "TRANSLATION_BREAKER", loader.CircuitBreaker())
+    monkeypatch.setattr(loader, "TRANSLATION_BACKEND", "fake")
+    return cache
+
+
+def _counter(loader, name):
+    return loader.STATS.snapshot()["counters"].get(name, 0)
+
+
+def test_fake_backend_hits_cache_after_miss(loader, cache, monkeypatch):
+    calls = []
+    original = loader.TRANSLATION_BACKENDS["fake"]
+    monkeypatch.setitem(loader.TRANSLATION_BACKENDS, "fake", lambda text: calls.append(text) or original(text))
+    hits = _counter(loader, "translation_cache_hits")
+    assert loader.translate_chinese_to_english("少女") == "[en] 少女"
+    assert cache.get("fake", "少女") == "[en] 少女"
+    assert loader.translate_chinese_to_english("少女") == "[en] 少女"
+    assert calls == ["少女"]
+    assert _counter(loader, "translation_cache_hits") == hits + 1
+
+
+def test_keys_are_normalized(cache):
+    cache.put("fake", "  少女，　微笑  ", "girl, smile")
+    # 全角逗号经 NFKC 变为半角，连续空白合并为一个空格
+    assert cache.get("fake", "少女, 微笑") == "girl, smile"
+    assert cache.get("fake", "少女,\t微笑\n") == "girl, smile"
+    assert cache.get("fake", "少女，微笑") is None
+    assert cache.get("dictionary", "少女, 微笑") is None
+
+
+def test_least_recently_used_entries_are_evicted(loader, monkeypatch):
+    # 固定递增的时钟，避免同一微秒内的写入顺序不确定
+    clock = itertools.count(1)
+    monkeypatch.setattr(loader.time, "time", lambda: float(next(clock)))
+    cache = loader.TranslationCache(path=":memory:", max_bytes=30)
+    cache.put("fake", "aaaa", "xxxxxx")  # 每条 10 字节
+    cache.put("fake", "bbbb", "xxxxxx")
+    cache.put("fake", "cccc", "xxxxxx")
+    assert cache.get("fake", "aaaa") == "xxxxxx"
+    cache.put("fake", "dddd", "xxxxxx")
+    assert cache.get("fake", "bbbb") is None
+    assert cache.get("fake", "aaaa") == "xxxxxx"
+    assert cache.get("fake", "cccc") == "xxxxxx"
+    assert cache.get("fake", "dddd") == "xxxxxx"
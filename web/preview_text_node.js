@@ -2,13 +2,95 @@
 import { app } from "../../scripts/app.js";
 // 导入 ComfyWidgets
 import { ComfyWidgets } from "../../scripts/widgets.js";
+import { api } from "../../scripts/api.js";
 
-// 启用调试输出
-const DEBUG = true;
+// 调试输出，默认关闭
+const DEBUG = false;
 function debug(...args) {
     if (DEBUG) console.log("[PreviewTextNode]", ...args);
 }
 
+// 每个节点最多缓存的页数，只有当前页放进文本框
+const MAX_CACHED_PAGES = 8;
+
+// 超过后端预览上限的文本：第0页为开头和结尾的摘要，之后按页向后端请求完整内容
+class PreviewPager {
+    constructor(node, meta, summary) {
+        this.node = node;
+        this.meta = meta;
+        this.summary = summary;
+        this.page = 0;
+        this.cache = new Map();
+    }
+
+    label() {
+        return this.page === 0
+            ? `摘要 (共 ${this.meta.length} 字符, ${this.meta.pages} 页)`
+            : `第 ${this.page} / ${this.meta.pages} 页`;
+    }
+
+    async fetchPage(page) {
+        if (this.cache.has(page)) {
+            const text = this.cache.get(page);
+            this.cache.delete(page);
+            this.cache.set(page, text);
+            return text;
+        }
+        const params = new URLSearchParams({ page, page_size: this.meta.page_size });
+        const response = await api.fetchApi(`/styles_csv_loader/preview/${this.meta.hash}?${params}`);
+        if (!response.ok) {
+            return `[无法读取第 ${page} 页: 预览已过期，请重新运行节点]`;
+        }
+        const { text } = await response.json();
+        this.cache.set(page, text);
+        if (this.cache.size > MAX_CACHED_PAGES) {
+            this.cache.delete(this.cache.keys().next().value);
+        }
+        return text;
+    }
+
+    async show(page) {
+        this.page = Math.min(Math.max(page, 0), this.meta.pages);
+        const text = this.page === 0 ? this.summary : await this.fetchPage(this.page);
+        setPreviewText(this.node, text);
+        updatePagerWidgets(this.node);
+    }
+}
+
+function findTextWidget(node) {
+    return node.textWidget || node.widgets?.find(w =>
+        w.name === "display_text" ||
+        w.type === "text" ||
+        w.type === "customtext"
+    );
+}
+
+function setPreviewText(node, text) {
+    const widget = findTextWidget(node);
+    if (widget) {
+        widget.value = text;
+        if (widget.inputEl) widget.inputEl.scrollTop = 0;
+    }
+    app.graph.setDirtyCanvas(true);
+}
+
+// 翻页按钮只在文本被截断时添加
+function updatePagerWidgets(node) {
+    const pager = node.previewPager;
+    if (pager && !node.pagerWidgets) {
+        const prev = node.addWidget("button", "preview_prev", null, () => node.previewPager?.show(node.previewPager.page - 1));
+        const next = node.addWidget("button", "preview_next", null, () => node.previewPager?.show(node.previewPager.page + 1));
+        prev.serialize = false;
+        next.serialize = false;
+        node.pagerWidgets = [prev, next];
+    }
+    if (!node.pagerWidgets) return;
+    const [prev, next] = node.pagerWidgets;
+    prev.label = pager ? "◀ 上一页" : "-";
+    next.label = pager ? `下一页 ▶  ${pager.label()}` : "-";
+    app.graph.setDirtyCanvas(true);
+}
+
 
 // 当 ComfyUI 加载完毕后执行
 app.registerExtension({
@@ -150,6 +232,19 @@ app.registerExtension({
                 
                 debug("执行结果:", message);
                 
+                // 超过大小上限的文本只收到摘要，完整内容按页读取
+                const preview = message?.preview?.[0];
+                if (preview) {
+                    const summary = Array.isArray(message.string) ? message.string.join("") : String(message.string ?? "");
+                    this.previewPager = new PreviewPager(this, preview, summary);
+                    this.previewPager.show(0);
+                    return;
+                }
+                if (this.previewPager) {
+                    this.previewPager = null;
+                    updatePagerWidgets(this);
+                }
+                
                 // 初始化文本变量
                 let textToDisplay = null;
                 
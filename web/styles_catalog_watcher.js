@@ -0,0 +1,81 @@
+// 接收后端CSV文件监视推送的风格名变化，原地更新加载节点的风格下拉框
+import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
+
+const EVENT = "styles_csv_loader.catalog_changed";
+// 节点类型 -> 风格下拉框名称
+const STYLE_WIDGETS = {
+    "Load Styles CSV": ["styles"],
+    "Multi Styles CSV": ["style1", "style2", "style3", "style4", "style5"],
+};
+// 多风格节点中表示不使用风格的选项，始终排在最前
+const NONE_OPTION = "无";
+
+// 通过分页接口拉取完整的风格名列表（变化太多时后端不推送增量）
+async function fetchAllStyles(csvFile) {
+    const names = [];
+    for (let page = 1; ; page++) {
+        const params = new URLSearchParams({ csv_file: csvFile, page, page_size: 500 });
+        const response = await api.fetchApi(`/styles_csv_loader/styles?${params}`);
+        if (!response.ok) return null;
+        const result = await response.json();
+        names.push(...result.items.map((item) => item.name));
+        if (names.length >= result.total || result.items.length === 0) return names;
+    }
+}
+
+function applyDiff(values, diff, prefix) {
+    const removed = new Set(diff.removed.map((name) => prefix + name));
+    const kept = values.filter((name) => !removed.has(name));
+    const existing = new Set(kept);
+    for (const name of diff.added) {
+        if (!existing.has(prefix + name)) kept.push(prefix + name);
+    }
+    return kept;
+}
+
+function setValues(widget, values) {
+    const hasNone = widget.options.values[0] === NONE_OPTION;
+    const list = values.filter((name) => name !== NONE_OPTION);
+    widget.options.values = hasNone ? [NONE_OPTION, ...list] : list;
+}
+
+async function onCatalogChanged({ detail }) {
+    if (!detail || detail.deleted) return;
+    const nodes = (app.graph?._nodes || []).filter((node) => STYLE_WIDGETS[node.type]);
+    // 按下拉框当前显示的文件缓存完整列表，同一文件只拉取一次
+    const fullLists = {};
+    for (const node of nodes) {
+        const fileWidget = node.widgets?.find((w) => w.name === "csv_file");
+        if (!fileWidget) continue;
+        let prefix;
+        if (fileWidget.value === detail.csv_file) {
+            prefix = "";
+        } else if (detail.merged_file && fileWidget.value === detail.merged_file) {
+            prefix = detail.merged_prefix;
+        } else {
+            continue;
+        }
+        if (detail.reload && !(fileWidget.value in fullLists)) {
+            fullLists[fileWidget.value] = await fetchAllStyles(fileWidget.value);
+        }
+        for (const widgetName of STYLE_WIDGETS[node.type]) {
+            const widget = node.widgets.find((w) => w.name === widgetName);
+            if (!widget?.options?.values) continue;
+            if (detail.reload) {
+                const names = fullLists[fileWidget.value];
+                if (names) setValues(widget, names);
+            } else {
+                setValues(widget, applyDiff(widget.options.values, detail, prefix));
+            }
+        }
+    }
+    app.graph?.setDirtyCanvas(true, false);
+}
+
+app.registerExtension({
+    name: "Styles.CatalogWatcher",
+    setup() {
+        api.addEventListener(EVENT, onCatalogChanged);
+    },
+});